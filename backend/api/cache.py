@@ -0,0 +1,120 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from recipes.models import Tag
+
+TAGS_VERSION_KEY = 'tags:version'
+INGREDIENTS_VERSION_KEY = 'ingredients:version'
+RECIPE_CACHE_HITS_KEY = 'recipe_cache:hits'
+RECIPE_CACHE_MISSES_KEY = 'recipe_cache:misses'
+
+
+def recipe_version_key(recipe_id):
+    return f'recipe:{recipe_id}:version'
+
+
+def get_version(key):
+    """Текущая версия набора данных; начальное значение уникально,
+    чтобы после вытеснения счётчика не отдать старые записи."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_cached_body(key, version, build):
+    """Готовый ответ (etag, body) для версии; build() отдаёт байты."""
+    cache_key = f'{key}:{version}'
+    cached = cache.get(cache_key)
+    if cached is None:
+        body = build()
+        cached = (hashlib.md5(body).hexdigest(), body)
+        cache.set(cache_key, cached, timeout=None)
+    return cached
+
+
+def get_tag_map():
+    """Соответствие slug -> id тэга, кэшируется до изменения тэгов."""
+    key = f'tags:map:{get_version(TAGS_VERSION_KEY)}'
+    tag_map = cache.get(key)
+    if tag_map is None:
+        tag_map = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_map, timeout=None)
+    return tag_map
+
+
+def incr_counter(key, delta=1):
+    if not delta:
+        return
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def get_recipe_fragments(recipes, build):
+    """Закэшированные фрагменты рецептов {pk: fragment}.
+
+    Ключ фрагмента включает версию рецепта и глобальные версии тэгов и
+    ингредиентов; build(recipes) строит фрагменты для промахов.
+    """
+    if not recipes:
+        return {}
+    version_keys = {recipe_version_key(recipe.pk): recipe.pk
+                    for recipe in recipes}
+    versions = cache.get_many(version_keys)
+    for key in version_keys.keys() - versions.keys():
+        cache.add(key, time.time_ns(), timeout=None)
+        versions[key] = cache.get(key, 0)
+    suffix = (f'{get_version(TAGS_VERSION_KEY)}:'
+              f'{get_version(INGREDIENTS_VERSION_KEY)}')
+    fragment_keys = {
+        f'recipe:{pk}:{versions[key]}:{suffix}': pk
+        for key, pk in version_keys.items()
+    }
+    cached = cache.get_many(fragment_keys)
+    fragments = {fragment_keys[key]: value for key, value in cached.items()}
+    misses = [recipe for recipe in recipes if recipe.pk not in fragments]
+    incr_counter(RECIPE_CACHE_HITS_KEY, len(fragments))
+    incr_counter(RECIPE_CACHE_MISSES_KEY, len(misses))
+    if misses:
+        built = build(misses)
+        cache.set_many({
+            key: built[pk] for key, pk in fragment_keys.items()
+            if pk in built
+        }, timeout=settings.RECIPE_CACHE_TIMEOUT)
+        fragments.update(built)
+    return fragments
+
+
+def get_recipe_cache_stats():
+    hits = cache.get(RECIPE_CACHE_HITS_KEY, 0)
+    misses = cache.get(RECIPE_CACHE_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0,
+    }
+
+
+def reset_recipe_cache_stats():
+    cache.delete_many([RECIPE_CACHE_HITS_KEY, RECIPE_CACHE_MISSES_KEY])
+
+
+def is_process_local_cache():
+    """Кэш живёт в памяти одного процесса: другие процессы его не видят."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
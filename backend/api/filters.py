@@ -1,9 +1,16 @@
+from django import forms
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
+
+from .cache import get_tag_map
 
 User = get_user_model()
 
+POPULAR_ORDERING = ('-favorites_count', '-created_at', '-id')
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr='startswith')
@@ -18,16 +25,88 @@ class CharFilterInFilter(filters.BaseInFilter, filters.CharFilter):
     pass
 
 
+class MultipleValueField(forms.Field):
+    """Все значения повторяющегося параметра: ?tags=a&tags=b."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        return [item for item in value or [] if item]
+
+
+class MultipleValueFilter(filters.Filter):
+    field_class = MultipleValueField
+
+
+class TagSlugsField(MultipleValueField):
+    """Слаги тэгов; неизвестный слаг -- ошибка валидации, как у выбора из
+    списка значений."""
+    default_error_messages = {
+        'invalid_choice':
+            forms.MultipleChoiceField.default_error_messages[
+                'invalid_choice'],
+    }
+
+    def validate(self, value):
+        super().validate(value)
+        if not value:
+            return
+        tag_map = get_tag_map()
+        for slug in value:
+            if slug not in tag_map:
+                raise forms.ValidationError(
+                    self.error_messages['invalid_choice'],
+                    code='invalid_choice', params={'value': slug})
+
+
+class TagsFilter(MultipleValueFilter):
+    field_class = TagSlugsField
+
+
 class RecipeFilter(FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = TagsFilter(method='filter_tags')
+    tags_match = filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')), method='filter_noop')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'),), method='filter_ordering')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
+    def filter_noop(self, queryset, name, value):
+        return queryset
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любым (по умолчанию) или со всеми (tags_match=all)
+        тэгами; без JOIN, поэтому без дублей."""
+        if not value:
+            return queryset
+        # Неизвестные слаги отсекает TagSlugsField.
+        tag_map = get_tag_map()
+        tag_ids = {tag_map[slug] for slug in value}
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id)))
+            return queryset
+        return queryset.filter(Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, описанию и ингредиентам;
+        результаты идут по релевантности."""
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """popular: по числу добавлений в избранное, по индексу
+        recipe_popular_idx."""
+        return queryset.order_by(*POPULAR_ORDERING)
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
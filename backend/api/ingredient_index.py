@@ -0,0 +1,58 @@
+import json
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+
+from .memory_index import TTLIndex
+
+
+def normalize(value):
+    """Ключ поиска: без учёта регистра, «ё» приравнивается к «е»."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex(TTLIndex):
+    """Префиксный индекс ингредиентов в памяти процесса.
+
+    Хранит отсортированные ключи и готовые JSON-фрагменты, поэтому поиск
+    при автодополнении обходится без запросов к базе. Индекс сбрасывается
+    сигналами сохранения и удаления Ingredient и перестраивается не реже,
+    чем раз в INGREDIENT_INDEX_TTL секунд.
+    """
+    ttl_setting = 'INGREDIENT_INDEX_TTL'
+
+    def _build(self):
+        rows = sorted(
+            (normalize(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator()
+        )
+        keys = [row[0] for row in rows]
+        fragments = [
+            json.dumps(
+                {'id': pk, 'name': name,
+                 'measurement_unit': measurement_unit},
+                ensure_ascii=False, separators=(',', ':'),
+            ).encode('utf-8')
+            for _, name, pk, measurement_unit in rows
+        ]
+        return keys, fragments
+
+    def search(self, prefix, limit=None):
+        """JSON-фрагменты ингредиентов, название которых начинается
+        с prefix, в алфавитном порядке."""
+        keys, fragments = self._get_state()
+        prefix = normalize(prefix or '')
+        if not prefix:
+            return fragments[:limit]
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(0x10FFFF), start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return fragments[start:end]
+
+    def render(self, prefix, limit=None):
+        return b'[' + b','.join(self.search(prefix, limit)) + b']'
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,134 @@
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Recipe, RecipeIngredient
+
+User = get_user_model()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, round(fraction * (len(values) - 1)))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет эндпоинты API через тестовый клиент Django на текущей '
+            'базе (данные - manage.py seed_bench): p50/p95 времени ответа, '
+            'число SQL-запросов и пик выделенной памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--user', type=int,
+                            help='id пользователя для авторизованных '
+                                 'запросов (по умолчанию первый bench_*).')
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument('--compare',
+                            help='JSON прошлого прогона для сравнения.')
+
+    def get_endpoints(self):
+        recipe = Recipe.objects.order_by('-created_at').first()
+        if recipe is None:
+            raise CommandError('Нет рецептов, сначала запустите seed_bench.')
+        return {
+            'recipes_anonymous': (False, '/api/recipes/'),
+            'recipes': (True, '/api/recipes/'),
+            'recipes_filtered': (
+                True, '/api/recipes/?is_favorited=1&tags='
+                      + (recipe.tags.values_list('slug', flat=True).first()
+                         or '')),
+            'recipes_cursor': (True, '/api/recipes/?cursor='),
+            'trending': (False, '/api/recipes/trending/'),
+            'recipe_detail': (True, f'/api/recipes/{recipe.pk}/'),
+            'pantry': (
+                True, '/api/recipes/pantry/?ingredients=' + ','.join(
+                    str(pk) for pk in RecipeIngredient.objects.filter(
+                        recipe=recipe).values_list(
+                            'ingredient_id', flat=True))),
+            'subscriptions': (
+                True, '/api/users/subscriptions/?recipes_limit=3'),
+            # Число запросов не должно зависеть от размера страницы.
+            'subscriptions_1_author': (
+                True, '/api/users/subscriptions/?recipes_limit=3&limit=1'),
+            'subscriptions_100_authors': (
+                True, '/api/users/subscriptions/?recipes_limit=3&limit=100'),
+            'download_shopping_cart': (
+                True, '/api/recipes/download_shopping_cart/'),
+            'tags': (False, '/api/tags/'),
+            'ingredients': (False, '/api/ingredients/?name=ка'),
+        }
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            return response, len(b''.join(response.streaming_content))
+        return response, len(response.content)
+
+    def measure(self, client, url, iterations):
+        """Время меряется отдельно от памяти: tracemalloc замедляет код."""
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.fetch(client, url)
+            timings.append((time.perf_counter() - started) * 1000)
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as context:
+            response, size = self.fetch(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            'status': response.status_code,
+            'bytes': size,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': len(context.captured_queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+        else:
+            users = users.filter(username__startswith='bench_')
+        user = users.first()
+        if user is None:
+            raise CommandError('Нет пользователя для замеров.')
+        anonymous, authenticated = Client(), Client()
+        authenticated.force_login(user)
+
+        results = {}
+        for name, (auth, url) in self.get_endpoints().items():
+            client = authenticated if auth else anonymous
+            results[name] = self.measure(
+                client, url, options['iterations'])
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        for name, result in results.items():
+            line = (f'{name:24} {result["status"]} '
+                    f'p50={result["p50_ms"]}ms p95={result["p95_ms"]}ms '
+                    f'queries={result["queries"]} '
+                    f'peak={result["peak_kb"]}KB')
+            if name in previous:
+                line += (f' (p50 было {previous[name]["p50_ms"]}ms, '
+                         f'queries было {previous[name]["queries"]})')
+            self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created_at': datetime.now().isoformat(),
+                    'database': connection.vendor,
+                    'iterations': options['iterations'],
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,73 @@
+import random
+import time
+
+from api.pantry_index import pantry_index
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+from recipes.models import RecipeIngredient
+
+from .bench_api import percentile
+
+
+def rank_sql(ingredient_ids):
+    """Тот же подбор, что и pantry_index.rank, одним GROUP BY в базе."""
+    return [
+        (row['recipe_id'], row['coverage'], row['matched'])
+        for row in RecipeIngredient.objects.values('recipe_id').annotate(
+            total=Count('ingredient_id', distinct=True),
+            matched=Count('ingredient_id', distinct=True,
+                          filter=Q(ingredient_id__in=ingredient_ids)),
+        ).filter(matched__gt=0).annotate(
+            coverage=Cast(F('matched'), FloatField()) / F('total'),
+        ).order_by('-coverage', '-matched', '-recipe_id')
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает подбор рецептов по продуктам из обратного индекса '
+            'в памяти с агрегирующим SQL-запросом на текущей базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--size', type=int, default=10,
+                            help='Сколько продуктов в наборе.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, rank, pantries):
+        timings = []
+        for pantry in pantries:
+            started = time.perf_counter()
+            rank(pantry)
+            timings.append((time.perf_counter() - started) * 1000)
+        return (f'p50={percentile(timings, 0.5):.2f}ms '
+                f'p95={percentile(timings, 0.95):.2f}ms')
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(RecipeIngredient.objects.values_list(
+            'ingredient_id', flat=True).distinct())
+        if not ingredient_ids:
+            raise CommandError('Нет рецептов, сначала запустите seed_bench.')
+        randomizer = random.Random(options['seed'])
+        size = min(options['size'], len(ingredient_ids))
+        pantries = [randomizer.sample(ingredient_ids, size)
+                    for _ in range(options['iterations'])]
+
+        started = time.perf_counter()
+        pantry_index.invalidate()
+        pantry_index.rank([])
+        self.stdout.write(
+            f'построение индекса: '
+            f'{(time.perf_counter() - started) * 1000:.2f}ms')
+
+        for pantry in pantries[:5]:
+            expected = [(pk, round(coverage, 6), matched)
+                        for pk, coverage, matched in rank_sql(pantry)]
+            actual = [(pk, round(coverage, 6), matched)
+                      for pk, coverage, matched in pantry_index.rank(pantry)]
+            if actual != expected:
+                raise CommandError('Индекс расходится с SQL.')
+
+        self.stdout.write(
+            f'индекс: {self.measure(pantry_index.rank, pantries)}')
+        self.stdout.write(f'SQL:    {self.measure(rank_sql, pantries)}')
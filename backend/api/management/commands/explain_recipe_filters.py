@@ -0,0 +1,73 @@
+import re
+from itertools import combinations
+
+from api.filters import RecipeFilter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from recipes.models import Recipe, Tag
+
+User = get_user_model()
+
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'SCAN (?:TABLE )?(\w+)(?! USING)(?!\w)'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для комбинаций фильтров RecipeFilter и '
+            'сообщает, какие таблицы читаются полным сканированием. '
+            'На маленьких таблицах Postgres выбирает Seq Scan независимо '
+            'от индексов, поэтому проверять стоит на реальном объёме.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int,
+                            help='id пользователя для фильтров избранного '
+                                 'и корзины (по умолчанию первый).')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать планы целиком.')
+
+    def get_params(self, user):
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        params = {
+            'author': str(user.pk),
+            'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+        }
+        if tag:
+            params['tags'] = tag
+        return params
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        params = self.get_params(user)
+        factory = RequestFactory()
+        seq_scans = 0
+        for size in range(len(params) + 1):
+            for names in combinations(sorted(params), size):
+                data = {name: params[name] for name in names}
+                request = factory.get('/api/recipes/', data)
+                request.user = user
+                filterset = RecipeFilter(
+                    request.GET, queryset=Recipe.objects.all(),
+                    request=request)
+                if not filterset.is_valid():
+                    raise CommandError(filterset.errors)
+                queryset = filterset.qs
+                plan = queryset.explain()
+                tables = sorted(set(pattern.findall(plan))) if pattern else []
+                seq_scans += bool(tables)
+                status = (f'SEQ SCAN: {", ".join(tables)}' if tables
+                          else 'OK')
+                self.stdout.write(f'{",".join(names) or "-"}: {status}')
+                if options['verbose_plans']:
+                    self.stdout.write(plan + '\n')
+        self.stdout.write(f'Комбинаций с полным сканированием: {seq_scans}')
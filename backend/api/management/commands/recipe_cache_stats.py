@@ -0,0 +1,26 @@
+from api.cache import (get_recipe_cache_stats, is_process_local_cache,
+                       reset_recipe_cache_stats)
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания и промахи кэша рецептов. Работает только '
+            'с общим для процессов кэшем (Redis, Memcached); иначе счётчики '
+            'доступны в /api/metrics/ работающего сервера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        if is_process_local_cache():
+            raise CommandError(
+                'Кэш по умолчанию хранится в памяти процесса, счётчики '
+                'сервера отсюда не видны. Смотрите recipe_cache в '
+                'GET /api/metrics/.')
+        stats = get_recipe_cache_stats()
+        self.stdout.write(
+            f'hits={stats["hits"]} misses={stats["misses"]} '
+            f'hit_ratio={stats["hit_ratio"]:.2%}')
+        if options['reset']:
+            reset_recipe_cache_stats()
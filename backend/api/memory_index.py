@@ -0,0 +1,45 @@
+import threading
+import time
+
+from django.conf import settings
+
+
+class TTLIndex:
+    """Индекс в памяти процесса с перестроением по времени.
+
+    Строится при первом обращении, сбрасывается invalidate() и
+    перестраивается не реже, чем раз в settings.<ttl_setting> секунд,
+    чтобы подхватывать изменения из других процессов. Подклассы задают
+    ttl_setting и _build(), который возвращает состояние индекса.
+    """
+    ttl_setting = None
+
+    def __init__(self):
+        # (время построения, состояние) меняются одним присваиванием.
+        self._state = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._state = None
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _is_fresh(self, state):
+        ttl = getattr(settings, self.ttl_setting)
+        return state is not None and time.monotonic() - state[0] <= ttl
+
+    def _get_state(self):
+        state = self._state
+        if not self._is_fresh(state):
+            with self._lock:
+                state = self._state
+                if not self._is_fresh(state):
+                    built_at = time.monotonic()
+                    state = self._state = (built_at, self._build())
+        return state[1]
+
+    def _loaded_state(self):
+        """Состояние без построения; None, если индекс не загружен."""
+        state = self._state
+        return None if state is None else state[1]
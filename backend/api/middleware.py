@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+class RequestStats:
+    """Агрегированные по view метрики запросов в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(Counter)
+
+    def add(self, view, duration, queries, sql_time, duplicates, size):
+        with self._lock:
+            stats = self._stats[view]
+            stats['requests'] += 1
+            stats['total_ms'] += duration
+            stats['max_ms'] = max(stats['max_ms'], duration)
+            stats['queries'] += queries
+            stats['max_queries'] = max(stats['max_queries'], queries)
+            stats['sql_ms'] += sql_time
+            stats['duplicate_queries'] += duplicates
+            stats['bytes'] += size or 0
+
+    def snapshot(self):
+        with self._lock:
+            stats = {view: dict(values)
+                     for view, values in self._stats.items()}
+        for values in stats.values():
+            requests = values['requests']
+            values['avg_ms'] = round(values['total_ms'] / requests, 2)
+            values['avg_queries'] = round(values['queries'] / requests, 2)
+            values['avg_sql_ms'] = round(values['sql_ms'] / requests, 2)
+            for key in ('total_ms', 'max_ms', 'sql_ms'):
+                values[key] = round(values[key], 2)
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+request_stats = RequestStats()
+
+
+class QueryRecorder:
+    """execute_wrapper, запоминающий SQL и время каждого запроса."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, duration in self.queries) * 1000
+
+    @property
+    def duplicates(self):
+        """Повторы одного и того же SQL - признак N+1."""
+        counts = Counter(sql for sql, _ in self.queries)
+        return sum(count - 1 for count in counts.values() if count > 1)
+
+
+class RequestMetricsMiddleware:
+    """Время view, число и время SQL-запросов, дубли запросов и размер
+    ответа в заголовке Server-Timing и в request_stats.
+
+    Включается настройкой REQUEST_METRICS_ENABLED; когда выключена,
+    Django исключает middleware из цепочки. Запросы, выполняемые при
+    чтении потокового ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        view = f'{request.method} {match.view_name if match else request.path}'
+        size = None if response.streaming else len(response.content)
+        duplicates = recorder.duplicates
+        request_stats.add(view, duration, len(recorder.queries),
+                          recorder.sql_time, duplicates, size)
+        response['Server-Timing'] = (
+            f'app;dur={duration:.2f}, '
+            f'db;dur={recorder.sql_time:.2f};'
+            f'desc="queries={len(recorder.queries)} '
+            f'duplicates={duplicates}"'
+        )
+        return response
@@ -1,5 +1,165 @@
+import base64
+import heapq
+import json
+from collections import OrderedDict
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def approximate_count(queryset):
+    """Оценка числа строк по плану запроса Postgres; на остальных базах
+    обычный COUNT(*)."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с опциональным режимом курсора.
+
+    Параметр ?cursor= (пустой для первой страницы) включает keyset-пагинацию
+    по полям view.cursor_ordering без OFFSET и COUNT(*); ?count=exact или
+    ?count=approx добавляет в ответ точное или приблизительное количество.
+    """
     page_size_query_param = "limit"
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Курсор нужен только запросам; готовые списки (например,
+        # ранжированные в памяти) всегда делятся на страницы по номеру.
+        self.cursor_mode = (self.cursor_query_param in request.query_params
+                            and hasattr(queryset, 'order_by'))
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        page_size = self.get_page_size(request)
+        count_mode = request.query_params.get(self.count_query_param)
+        self.count = None
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'approx':
+            self.count = approximate_count(queryset)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(queryset.model, position))
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_keyset_filter(self, model, position):
+        """Строки строго после position в порядке self.ordering."""
+        keyset = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return keyset
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if (not isinstance(values, list)
+                    or len(values) != len(self.ordering)):
+                raise ValueError(encoded)
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        values = [value.isoformat() if hasattr(value, 'isoformat')
+                  else value for value in values]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = None
+        response['results'] = data
+        return Response(response)
+
+
+class MergedCursorPagination(CustomPagination):
+    """Курсорная пагинация объединения нескольких запросов.
+
+    Из каждого запроса берётся по странице после курсора, страницы
+    сливаются в порядке cursor_ordering (все поля в одном направлении),
+    строки с одинаковым ключом выводятся один раз.
+    """
+
+    def paginate_queryset(self, querysets, request, view=None):
+        self.cursor_mode = True
+        self.request = request
+        self.count = None
+        self.ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, querysets[0].model)
+        parts = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*self.ordering)
+            if position is not None:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(queryset.model, position))
+            parts.append(list(queryset[:page_size + 1]))
+
+        key = attrgetter(*(field.lstrip('-') for field in self.ordering))
+        results = []
+        for row in heapq.merge(*parts, key=key,
+                               reverse=self.ordering[0].startswith('-')):
+            if results and key(results[-1]) == key(row):
+                continue
+            results.append(row)
+            if len(results) > page_size:
+                break
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+
+class FeedPagination(MergedCursorPagination):
+    cursor_ordering = ('-created_at', '-recipe_id')
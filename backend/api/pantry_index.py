@@ -0,0 +1,116 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import chain
+
+from recipes.models import RecipeIngredient
+
+from .memory_index import TTLIndex
+
+
+class PantryIndex(TTLIndex):
+    """Обратный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта -- его ингредиенты. Подбор рецептов по набору
+    продуктов сводится к подсчёту вхождений в нескольких массивах, без
+    запросов к базе. Сигналы сохранения рецептов обновляют индекс точечно,
+    а раз в PANTRY_INDEX_TTL секунд он строится заново, чтобы подхватить
+    изменения из других процессов.
+    """
+    ttl_setting = 'PANTRY_INDEX_TTL'
+
+    def _build(self):
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+                'recipe_id', 'ingredient_id').iterator():
+            recipes[recipe_id].add(ingredient_id)
+        postings = defaultdict(list)
+        for recipe_id in sorted(recipes):
+            for ingredient_id in recipes[recipe_id]:
+                postings[ingredient_id].append(recipe_id)
+        return (
+            {key: array('q', value) for key, value in postings.items()},
+            {key: frozenset(value) for key, value in recipes.items()},
+        )
+
+    def update_recipes(self, recipe_ids):
+        """Перечитывает ингредиенты рецептов recipe_ids одним запросом.
+
+        Изменённые массивы заменяются новыми, а не правятся на месте,
+        поэтому параллельный подбор видит либо старую, либо новую версию.
+        """
+        recipe_ids = set(recipe_ids)
+        if self._loaded_state() is None or not recipe_ids:
+            return
+        fresh = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                    'recipe_id', 'ingredient_id'):
+            fresh[recipe_id].add(ingredient_id)
+        with self._lock:
+            state = self._loaded_state()
+            if state is None:
+                return
+            postings, recipes = state
+            for recipe_id in recipe_ids:
+                old = recipes.pop(recipe_id, frozenset())
+                new = frozenset(fresh.get(recipe_id, ()))
+                if new:
+                    recipes[recipe_id] = new
+                for ingredient_id in old - new:
+                    self._discard(postings, ingredient_id, recipe_id)
+                for ingredient_id in new - old:
+                    self._insert(postings, ingredient_id, recipe_id)
+
+    def remove_recipes(self, recipe_ids):
+        with self._lock:
+            state = self._loaded_state()
+            if state is None:
+                return
+            postings, recipes = state
+            for recipe_id in recipe_ids:
+                for ingredient_id in recipes.pop(recipe_id, ()):
+                    self._discard(postings, ingredient_id, recipe_id)
+
+    @staticmethod
+    def _insert(postings, ingredient_id, recipe_id):
+        values = array('q', postings.get(ingredient_id, ()))
+        index = bisect_left(values, recipe_id)
+        if index == len(values) or values[index] != recipe_id:
+            values.insert(index, recipe_id)
+        postings[ingredient_id] = values
+
+    @staticmethod
+    def _discard(postings, ingredient_id, recipe_id):
+        values = array('q', postings.get(ingredient_id, ()))
+        index = bisect_left(values, recipe_id)
+        if index < len(values) and values[index] == recipe_id:
+            del values[index]
+        if values:
+            postings[ingredient_id] = values
+        else:
+            postings.pop(ingredient_id, None)
+
+    def rank(self, ingredient_ids, min_coverage=0.0):
+        """[(recipe_id, coverage, matched)] по убыванию доли ингредиентов
+        рецепта, которые есть в ingredient_ids."""
+        postings, recipes = self._get_state()
+        counts = Counter(chain.from_iterable(
+            postings.get(ingredient_id, ())
+            for ingredient_id in set(ingredient_ids)
+        ))
+        ranked = []
+        for recipe_id, matched in counts.items():
+            total = len(recipes.get(recipe_id, ()))
+            if not total:
+                continue
+            coverage = matched / total
+            if coverage >= min_coverage:
+                ranked.append((coverage, matched, recipe_id))
+        ranked.sort(reverse=True)
+        return [(recipe_id, coverage, matched)
+                for coverage, matched, recipe_id in ranked]
+
+
+pantry_index = PantryIndex()
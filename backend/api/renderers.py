@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+from datetime import datetime
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_RENDERERS = []
+
+
+def register_shopping_list_renderer(renderer_class):
+    """Добавляет формат выгрузки списка покупок (?format=<format>)."""
+    SHOPPING_LIST_RENDERERS.append(renderer_class)
+    return renderer_class
+
+
+class ShoppingListContentNegotiation(DefaultContentNegotiation):
+    """Формат выгрузки задаётся только параметром ?format=, без него
+    отдаётся первый зарегистрированный (txt); заголовок Accept, как и
+    раньше, не учитывается."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE)
+        if format_query:
+            renderers = self.filter_renderers(renderers, format_query)
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Выгрузка списка покупок по частям.
+
+    stream() получает итератор строк с ключами ingredient__name,
+    ingredient__measurement_unit и amount и отдаёт куски файла.
+    render() используется только для ответов с ошибками.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def get_content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def get_filename(self, user):
+        return f'{user.username}_shopping_list.{self.format}'
+
+    def stream(self, user, ingredients):
+        raise NotImplementedError
+
+
+@register_shopping_list_renderer
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, user, ingredients):
+        today = datetime.today()
+        yield (
+            f'Список покупок для: {user.get_full_name()}\n\n'
+            f'Дата: {today:%Y-%m-%d}\n\n'
+        )
+        for ingredient in ingredients:
+            yield (
+                f'- {ingredient["ingredient__name"]} '
+                f'({ingredient["ingredient__measurement_unit"]})'
+                f' - {ingredient["amount"]}\n'
+            )
+        yield f'\nFoodgram ({today:%Y})'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+@register_shopping_list_renderer
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, user, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Единица измерения',
+                               'Количество'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount'],
+            ))
+
+
+@register_shopping_list_renderer
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """PDF собирается reportlab целиком, строки читаются итератором."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not font_path or not os.path.exists(font_path):
+            return 'Helvetica'
+        if 'ShoppingListFont' not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont('ShoppingListFont', font_path))
+        return 'ShoppingListFont'
+
+    def stream(self, user, ingredients):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        line_height = self.font_size * 1.5
+
+        def new_text():
+            text = pdf.beginText(self.margin, height - self.margin)
+            text.setFont(font, self.font_size)
+            return text
+
+        text = new_text()
+        text.textLine(f'Список покупок для: {user.get_full_name()}')
+        text.textLine(f'Дата: {datetime.today():%Y-%m-%d}')
+        text.textLine('')
+        for ingredient in ingredients:
+            if text.getY() < self.margin + line_height:
+                pdf.drawText(text)
+                pdf.showPage()
+                text = new_text()
+            text.textLine(
+                f'- {ingredient["ingredient__name"]} '
+                f'({ingredient["ingredient__measurement_unit"]})'
+                f' - {ingredient["amount"]}'
+            )
+        pdf.drawText(text)
+        pdf.save()
+        yield buffer.getvalue()
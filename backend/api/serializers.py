@@ -1,20 +1,74 @@
 import base64
-
-from django.core.files.base import ContentFile
+import binascii
+from collections import defaultdict
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Manager, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from PIL import Image
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem, Tag, recipe_content_lookups)
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 from rest_framework.serializers import ModelSerializer
-from users.models import Subscribe, User
+from users.models import User
+
+from .cache import get_recipe_fragments
+
+# Связь текущего пользователя: (related_name у User, поле с id объекта).
+USER_RELATIONS = {
+    'favorites': ('favorites', 'recipe_id'),
+    'shopping_cart': ('shopping_cart', 'recipe_id'),
+    'subscriptions': ('subscriber', 'author_id'),
+}
+
+
+def page_instances(serializer, obj):
+    """Уже загруженные объекты страницы, в которую входит obj.
+
+    Страница берётся из списочного сериализатора-родителя, а для вложенного
+    сериализатора (например, автора рецепта) -- из списка над родителем.
+    """
+    list_serializer, nested = serializer.parent, False
+    if not isinstance(list_serializer, serializers.ListSerializer):
+        list_serializer = getattr(list_serializer, 'parent', None)
+        nested = True
+    if (not isinstance(list_serializer, serializers.ListSerializer)
+            or not isinstance(list_serializer.instance, (list, tuple))):
+        return [obj]
+    if nested:
+        return [serializer.get_attribute(item)
+                for item in list_serializer.instance]
+    return list_serializer.instance
+
+
+def has_user_relation(serializer, relation, obj):
+    """Связан ли текущий пользователь с obj через relation.
+
+    Id загружаются при первом обращении к relation и только для объектов
+    текущей страницы, поэтому страница обходится одним запросом на связь.
+    """
+    user = serializer.context['request'].user
+    loaded = serializer.context.setdefault(
+        'user_relations', {}).setdefault(relation, {})
+    if obj.pk not in loaded:
+        related_name, field = USER_RELATIONS[relation]
+        pks = {item.pk for item in page_instances(serializer, obj)
+               if item is not None and item.pk not in loaded}
+        pks.add(obj.pk)
+        found = set(getattr(user, related_name).filter(
+            **{f'{field}__in': pks}).values_list(field, flat=True))
+        loaded.update((pk, pk in found) for pk in pks)
+    return loaded[obj.pk]
 
 
 class TagSerializer(serializers.ModelSerializer):
-    recipes = serializers.StringRelatedField(many=True, read_only=True)
-
     class Meta:
         model = Tag
-        fields = ['id', 'name', 'color', 'slug', 'recipes']
+        fields = ['id', 'name', 'color', 'slug']
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -43,18 +97,106 @@ class CustomUserSerializer(UserSerializer):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        return Subscribe.objects.filter(user=user, author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return has_user_relation(self, 'subscriptions', obj)
 
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение в виде data URL: data:image/<формат>;base64,<данные>.
+
+    Размер проверяется по длине строки до декодирования, данные
+    декодируются частями во временный файл (в памяти до
+    FILE_UPLOAD_MAX_MEMORY_SIZE, дальше на диске), а Pillow проверяет
+    только заголовок и структуру файла, не распаковывая пиксели.
+    Переносы строк и пробелы внутри base64 допускаются. Расширение файла
+    берётся из extensions по формату, который определил Pillow.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Некорректные данные изображения в base64.',
+        'too_large': 'Размер изображения не должен превышать '
+                     '{max_size} байт.',
+        'unsupported_format': 'Формат изображения {image_format} '
+                              'не поддерживается.',
+    }
+    # MPO - JPEG со стереопарой или превью, которые пишут камеры
+    # телефонов; браузеры показывают его как обычный JPEG.
+    extensions = {
+        'JPEG': 'jpg',
+        'MPO': 'jpg',
+        'PNG': 'png',
+        'GIF': 'gif',
+        'WEBP': 'webp',
+    }
+    header_limit = 100
+    chunk_size = 64 * 1024
+    whitespace = str.maketrans('', '', ' \t\n\r\v\f')
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            return self.decode_base64(data)
         return super().to_internal_value(data)
 
+    def decode_base64(self, data):
+        marker = ';base64,'
+        offset = data.find(marker, 0, self.header_limit)
+        if offset == -1:
+            self.fail('invalid_base64')
+        start = offset + len(marker)
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        # Переносы строк (base64 в формате MIME) и выравнивание «=» в конце
+        # в размер не входят.
+        skipped = (data.count('\n', start) + data.count('\r', start)
+                   + data.count('=', max(start, len(data) - 8)))
+        if (len(data) - start - skipped) * 3 // 4 > max_size:
+            self.fail('too_large', max_size=max_size)
+
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        # Пробелы выбрасываются из каждой части, а хвост, не кратный
+        # четырём символам, переносится в следующую.
+        rest = ''
+        size = 0
+        try:
+            for position in range(start, len(data), self.chunk_size):
+                chunk = rest + data[
+                    position:position + self.chunk_size
+                ].translate(self.whitespace)
+                aligned = len(chunk) - len(chunk) % 4
+                rest = chunk[aligned:]
+                size += file.write(
+                    base64.b64decode(chunk[:aligned], validate=True))
+                if size > max_size:
+                    file.close()
+                    self.fail('too_large', max_size=max_size)
+            if rest:
+                raise binascii.Error('Incorrect padding')
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        try:
+            extension = self.get_extension(file)
+        except serializers.ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+        return serializers.FileField.to_internal_value(
+            self, File(file, name=f'temp.{extension}'))
+
+    def get_extension(self, file):
+        """Проверяет файл Pillow и возвращает расширение для его формата."""
+        try:
+            file.seek(0)
+            with Image.open(file) as image:
+                image_format = image.format
+                image.verify()
+        except Exception:
+            self.fail('invalid_image')
+        extension = self.extensions.get(image_format)
+        if extension is None:
+            self.fail('unsupported_format', image_format=image_format)
+        return extension
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -78,23 +220,114 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+def resolve_pks(queryset, pks, label):
+    """Достаёт объекты по списку id одним запросом ``in_bulk``.
+
+    Все отсутствующие и повторяющиеся id попадают в одну ошибку.
+    """
+    objects = queryset.in_bulk(set(pks))
+    seen = set()
+    duplicates = []
+    for pk in pks:
+        if pk in seen and pk not in duplicates:
+            duplicates.append(pk)
+        seen.add(pk)
+    missing = [pk for pk in dict.fromkeys(pks) if pk not in objects]
+    errors = []
+    if missing:
+        errors.append(f'{label} не найдены: '
+                      f'{", ".join(map(str, missing))}.')
+    if duplicates:
+        errors.append(f'{label} повторяются: '
+                      f'{", ".join(map(str, duplicates))}.')
+    if errors:
+        raise serializers.ValidationError(errors)
+    return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """Список id, который проверяется одним запросом вместо
+    запроса на каждый элемент, как у PrimaryKeyRelatedField(many=True)."""
+
+    child = serializers.IntegerField(min_value=1)
+
+    def __init__(self, queryset, label_plural, **kwargs):
+        self.queryset = queryset
+        self.label_plural = label_plural
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        return resolve_pks(self.queryset.all(), pks, self.label_plural)
+
+    def to_representation(self, value):
+        return [item.pk for item in value.all()]
+
+
+class IngredientCreateInRecipeListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = resolve_pks(
+            Ingredient.objects.all(),
+            [item['ingredient'] for item in items],
+            'Ингредиенты'
+        )
+        for item, ingredient in zip(items, ingredients):
+            item['ingredient'] = ingredient
+        return items
+
+
 class IngredientCreateInRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
-    )
+    # Существование id проверяется разом в списочном сериализаторе.
+    id = serializers.IntegerField(source='ingredient', min_value=1)
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = IngredientCreateInRecipeListSerializer
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+def get_image_url(serializer, image):
+    if not image:
+        return None
+    request = serializer.context.get('request')
+    if request is None:
+        return image.url
+    return request.build_absolute_uri(image.url)
+
+
+class RecipeContentSerializer(serializers.ModelSerializer):
+    """Часть рецепта, одинаковая для всех пользователей; кэшируется."""
     ingredients = RecipeIngredientSerializer(
         many=True, read_only=True, source='recipeingredient_set')
     tags = TagSerializer(read_only=True, many=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('tags', 'ingredients')
+
+
+def build_recipe_fragments(recipes):
+    prefetch_related_objects(recipes, *recipe_content_lookups())
+    return {recipe.pk: RecipeContentSerializer(recipe).data
+            for recipe in recipes}
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        recipes = list(data)
+        self.child.load_fragments(recipes)
+        return super().to_representation(recipes)
+
+
+class RecipeReadSerializer(serializers.ModelSerializer):
+    ingredients = SerializerMethodField(read_only=True)
+    tags = SerializerMethodField(read_only=True)
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField(required=False, allow_null=True)
+    image = SerializerMethodField(read_only=True)
     is_favorited = SerializerMethodField(read_only=True)
     is_in_shopping_cart = SerializerMethodField(read_only=True)
 
@@ -112,24 +345,65 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'created_at',
                   )
+        list_serializer_class = RecipeListSerializer
+
+    def load_fragments(self, recipes):
+        fragments = self.context.setdefault('recipe_fragments', {})
+        fragments.update(get_recipe_fragments(
+            [recipe for recipe in recipes if recipe.pk not in fragments],
+            build_recipe_fragments,
+        ))
+        return fragments
+
+    def get_fragment(self, obj):
+        fragments = self.context.get('recipe_fragments', {})
+        if obj.pk not in fragments:
+            fragments = self.load_fragments([obj])
+        return fragments[obj.pk]
+
+    def get_image(self, obj):
+        """В списках - миниатюра, если она уже готова; иначе оригинал."""
+        if isinstance(self.parent, serializers.ListSerializer):
+            return get_image_url(self, obj.thumbnail or obj.image)
+        return get_image_url(self, obj.image)
+
+    def get_tags(self, obj):
+        return self.get_fragment(obj)['tags']
+
+    def get_ingredients(self, obj):
+        return self.get_fragment(obj)['ingredients']
 
     def get_is_favorited(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        return user.favorites.filter(recipe=obj).exists()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return has_user_relation(self, 'favorites', obj)
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        return user.shopping_cart.filter(recipe=obj).exists()
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return has_user_relation(self, 'shopping_cart', obj)
+
+
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """Рецепт в подборе по продуктам: доля и число ингредиентов из
+    переданного набора."""
+    coverage = serializers.FloatField(read_only=True)
+    matched = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('coverage', 'matched')
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     ingredients = IngredientCreateInRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(),
+                                      label_plural='Теги')
     image = Base64ImageField(required=False, allow_null=True)
     author = CustomUserSerializer(read_only=True)
 
@@ -139,6 +413,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                 "Добавьте хотя бы один ингредиент.")
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         """Если нам надо записывать в поле ingredients переопределяем метод
         create. Сохраняет в т.ч. данные из поля ingredients и tags"""
@@ -161,25 +436,52 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
         return recipe
 
+    def update_ingredients(self, instance, ingredients):
+        """Меняет только отличающиеся строки RecipeIngredient: не больше
+        одного DELETE, UPDATE и INSERT на всё обновление."""
+        new_amounts = defaultdict(int)
+        for ingredient in ingredients:
+            new_amounts[ingredient['ingredient'].pk] += ingredient['amount']
+
+        old_amounts = defaultdict(int)
+        kept = {}
+        to_delete = []
+        for row in RecipeIngredient.objects.filter(recipe=instance):
+            ingredient_id = row.ingredient_id
+            old_amounts[ingredient_id] += row.amount
+            if ingredient_id in new_amounts and ingredient_id not in kept:
+                kept[ingredient_id] = row
+            else:
+                to_delete.append(row.pk)
+
+        to_update = []
+        for ingredient_id, row in kept.items():
+            if row.amount != new_amounts[ingredient_id]:
+                row.amount = new_amounts[ingredient_id]
+                to_update.append(row)
+        to_create = [
+            RecipeIngredient(recipe=instance, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in kept
+        ]
+
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        ShoppingListItem.objects.update_recipe(
+            instance, old_amounts, new_amounts)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients', None)
         tags = validated_data.pop('tags', None)
         if ingredients is not None:
-            instance.ingredients.clear()
-
-            create_ingredients = [
-                RecipeIngredient(
-                    recipe=instance,
-                    ingredient=ingredient['ingredient'],
-                    amount=ingredient['amount']
-                )
-                for ingredient in ingredients
-            ]
-            RecipeIngredient.objects.bulk_create(
-                create_ingredients
-            )
+            self.update_ingredients(instance, ingredients)
         if tags is not None:
-            instance.tags.clear()
             instance.tags.set(tags)
 
         return super().update(instance, validated_data)
@@ -203,7 +505,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
 
 class RecipeShortSerializer(ModelSerializer):
-    image = Base64ImageField()
+    image = SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipe
@@ -213,3 +515,6 @@ class RecipeShortSerializer(ModelSerializer):
             'image',
             'cooking_time'
         )
+
+    def get_image(self, obj):
+        return get_image_url(self, obj.thumbnail or obj.image)
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+from .cache import (INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY, bump_version,
+                    recipe_version_key)
+from .ingredient_index import ingredient_index
+from .pantry_index import pantry_index
+
+
+def bump_after_commit(key):
+    """Сбрасывает версию сразу и повторно после коммита, чтобы параллельный
+    запрос не закэшировал данные незавершённой транзакции."""
+    bump_version(key)
+    transaction.on_commit(lambda: bump_version(key))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    bump_after_commit(INGREDIENTS_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_after_commit(TAGS_VERSION_KEY)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    bump_after_commit(recipe_version_key(instance.pk))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    bump_after_commit(recipe_version_key(instance.recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_pantry_index(sender, instance, **kwargs):
+    # Ингредиенты рецепта пишутся bulk-операциями без сигналов, поэтому
+    # состав перечитывается после коммита сохранения самого рецепта.
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(lambda: pantry_index.update_recipes([recipe_id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_pantry_index(sender, instance, **kwargs):
+    pantry_index.remove_recipes([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_after_commit(recipe_version_key(instance.pk))
+    elif pk_set:
+        for recipe_id in pk_set:
+            bump_after_commit(recipe_version_key(recipe_id))
+    else:
+        bump_after_commit(TAGS_VERSION_KEY)
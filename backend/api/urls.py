@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipesViewSet, TagViewSet
+from .views import (IngredientViewSet, RecipesViewSet, RequestMetricsView,
+                    TagViewSet)
 
 router = DefaultRouter()
 router.register('recipes', RecipesViewSet, basename='recipes')
@@ -10,5 +11,6 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 
 
 urlpatterns = [
+    path('metrics/', RequestMetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
@@ -1,22 +1,61 @@
-from datetime import datetime
-
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
-from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.models import (Favourite, FeedEntry, Ingredient, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag,
+                            TrendingRecipe, bump_counter)
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.permissions import (SAFE_METHODS, IsAdminUser,
+                                        IsAuthenticated)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
+from rest_framework.views import APIView
 
-from .filters import IngredientFilter, RecipeFilter
+from .cache import (TAGS_VERSION_KEY, get_cached_body, get_recipe_cache_stats,
+                    get_version, reset_recipe_cache_stats)
+from .filters import POPULAR_ORDERING, IngredientFilter, RecipeFilter
+from .ingredient_index import ingredient_index
+from .middleware import request_stats
+from .pagination import CustomPagination, FeedPagination
+from .pantry_index import pantry_index
 from .permissions import IsOwnerOrReadOnly, ReadOnly
-from .serializers import (IngredientSerializer, RecipeCreateUpdateSerializer,
-                          RecipeReadSerializer, RecipeShortSerializer,
-                          TagSerializer)
+from .renderers import SHOPPING_LIST_RENDERERS, ShoppingListContentNegotiation
+from .serializers import (IngredientSerializer, PantryRecipeSerializer,
+                          RecipeCreateUpdateSerializer, RecipeReadSerializer,
+                          RecipeShortSerializer, TagSerializer)
+
+
+def insert_ignore(obj):
+    """Одиночный INSERT obj, пропускающий нарушение уникальности.
+
+    Возвращает True, если строка вставлена. В отличие от exists() + create()
+    не оставляет окна для гонки между проверкой и вставкой. Значения полей
+    готовятся как при save(), так что auto_now_add тоже заполняется.
+    """
+    opts = obj._meta
+    fields = [field for field in opts.concrete_fields
+              if not field.primary_key]
+    quote = connection.ops.quote_name
+    sql = '{} {} ({}) VALUES ({}){}'.format(
+        connection.ops.insert_statement(ignore_conflicts=True),
+        quote(opts.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    )
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, add=True), connection)
+        for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount > 0
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -27,6 +66,13 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """Автодополнение по префиксу названия из индекса в памяти."""
+        name = request.query_params.get('name')
+        limit = settings.INGREDIENT_SEARCH_LIMIT if name else None
+        return HttpResponse(ingredient_index.render(name, limit),
+                            content_type='application/json')
+
 
 class TagViewSet(viewsets.ModelViewSet):  # ReadOnly
     queryset = Tag.objects.all()
@@ -34,12 +80,44 @@ class TagViewSet(viewsets.ModelViewSet):  # ReadOnly
     pagination_class = None
     permission_classes = (ReadOnly,)
 
+    def list(self, request, *args, **kwargs):
+        """Список тэгов из кэша с ETag; кэш сбрасывается при изменении
+        тэгов."""
+        etag, body = get_cached_body(
+            'tags:list', get_version(TAGS_VERSION_KEY),
+            lambda: JSONRenderer().render(
+                self.get_serializer(self.get_queryset(), many=True).data)
+        )
+        etag = f'"{etag}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
 
 class RecipesViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsOwnerOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = CustomPagination
+
+    @property
+    def cursor_ordering(self):
+        if self.request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return ('-created_at', '-id')
+
+    def get_queryset(self):
+        if self.request.method not in SAFE_METHODS:
+            return super().get_queryset()
+        user = self.request.user
+        # id разрешает равные created_at, иначе страницы по OFFSET на
+        # Postgres могут повторять и терять рецепты.
+        return Recipe.objects.with_related(
+            user, content=False).with_user_flags(user).order_by(
+                '-created_at', '-id')
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -70,53 +148,136 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return self.delete_from(ShoppingCart, request.user, pk)
 
     def add_to(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
-            return Response({'errors': 'Рецепт уже добавлен!'},
-                            status=status.HTTP_400_BAD_REQUEST)
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            if not insert_ignore(model(user=user, recipe=recipe)):
+                return Response({'errors': 'Рецепт уже добавлен!'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            bump_counter(Recipe, recipe.pk, model.counter_field)
+            if model is ShoppingCart:
+                ShoppingListItem.objects.add_recipe(user, recipe)
         serializer = RecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_from(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response({'errors': 'Рецепт уже удален!'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(user=user, recipe_id=pk).delete()
+            if not deleted:
+                return Response({'errors': 'Рецепт уже удален!'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            bump_counter(Recipe, pk, model.counter_field, -1)
+            if model is ShoppingCart:
+                ShoppingListItem.objects.remove_recipe(user, pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Лента рецептов авторов из подписок, новые сначала; листается
+        курсором ?cursor= по готовой ленте пользователя."""
+        user = request.user
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset((
+            FeedEntry.objects.filter(user=user).only(
+                'created_at', 'recipe_id'),
+            FeedEntry.objects.unfanned_recipes(user).annotate(
+                recipe_id=F('pk')).only('created_at'),
+        ), request)
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in page])
+        serializer = RecipeReadSerializer(
+            [recipes[entry.recipe_id] for entry in page
+             if entry.recipe_id in recipes],
+            many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def trending(self, request):
+        """Популярное за последнее время: готовый топ, который
+        пересчитывает manage.py compute_trending."""
+        page = self.paginate_queryset(list(
+            TrendingRecipe.objects.values_list('recipe_id', flat=True)))
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = RecipeReadSerializer(
+            [recipes[recipe_id] for recipe_id in page
+             if recipe_id in recipes],
+            many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def pantry(self, request):
+        """Что приготовить из продуктов ?ingredients=1,2,3: рецепты по
+        убыванию доли своих ингредиентов, которые есть в наборе;
+        ?min_coverage=0.5 отсекает рецепты с меньшей долей."""
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            }
+            min_coverage = float(request.query_params.get('min_coverage', 0))
+        except ValueError:
+            return Response({'errors': 'Неверный id ингредиента или доля.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not ingredient_ids:
+            return Response({'errors': 'Укажите ингредиенты.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        page = self.paginate_queryset(
+            pantry_index.rank(ingredient_ids, min_coverage))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page])
+        results = []
+        for recipe_id, coverage, matched in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.coverage = round(coverage, 4)
+                recipe.matched = matched
+                results.append(recipe)
+        serializer = PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=False,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+        content_negotiation_class=ShoppingListContentNegotiation,
     )
     def download_shopping_cart(self, request):
+        """Список покупок в формате ?format=txt|csv|pdf, отдаётся потоком."""
         user = request.user
         if not user.shopping_cart.exists():
             return Response(status=HTTP_400_BAD_REQUEST)
 
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values(
             'ingredient__name',
             'ingredient__measurement_unit'
         ).annotate(amount=Sum('amount')).order_by('ingredient__name')
 
-        today = datetime.today()
-        shopping_list = (
-            f'Список покупок для: {user.get_full_name()}\n\n'
-            f'Дата: {today:%Y-%m-%d}\n\n'
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(user, ingredients.iterator()),
+            content_type=renderer.get_content_type()
         )
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        shopping_list += f'\n\nFoodgram ({today:%Y})'
-
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-
+        response['Content-Disposition'] = (
+            f'attachment; filename={renderer.get_filename(user)}')
         return response
+
+
+class RequestMetricsView(APIView):
+    """Метрики запросов этого процесса и счётчики кэша рецептов;
+    DELETE обнуляет их."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({
+            'views': request_stats.snapshot(),
+            'recipe_cache': get_recipe_cache_stats(),
+        })
+
+    def delete(self, request):
+        request_stats.reset()
+        reset_recipe_cache_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
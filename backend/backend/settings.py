@@ -62,8 +62,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.RequestMetricsMiddleware',
 ]
 
+# Метрики запросов (Server-Timing и /api/metrics/), по умолчанию выключены.
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED') == 'True'
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -105,6 +109,17 @@ DATABASES = {
 #     }
 # }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+# Время жизни закэшированных тэгов и ингредиентов рецепта, в секундах.
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -145,6 +160,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Предельный размер изображения рецепта (client_max_body_size в nginx - 5M).
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+
+# Миниатюры рецептов создаются в фоновых потоках после сохранения.
+RECIPE_THUMBNAIL_SIZE = (480, 480)
+RECIPE_THUMBNAIL_FORMAT = 'WEBP'
+IMAGE_PROCESSING_WORKERS = 2
+IMAGE_PROCESSING_ASYNC = os.getenv('IMAGE_PROCESSING_ASYNC', 'True') == 'True'
+
 AUTH_USER_MODEL = 'users.User'
 
 # Default primary key field type
@@ -185,3 +209,26 @@ REST_FRAMEWORK = {
 
     ),
 }
+
+# TTF-шрифт с кириллицей для выгрузки списка покупок в PDF.
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Автодополнение ингредиентов из индекса в памяти процесса.
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 300
+
+# Подбор рецептов по продуктам из обратного индекса в памяти процесса.
+PANTRY_INDEX_TTL = 300
+
+# Рецепты авторов с большим числом подписчиков не раскладываются по лентам
+# при публикации, а подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+
+# Популярное: manage.py compute_trending по событиям за TRENDING_WINDOW_DAYS
+# дней, вклад события убывает вдвое каждые TRENDING_HALF_LIFE_HOURS часов.
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_SIZE = 100
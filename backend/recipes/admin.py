@@ -2,19 +2,26 @@ from django.contrib import admin
 from django.contrib.admin import display
 
 from .models import Ingredient, Recipe, Tag
+from .search import search_recipes
 
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'author', 'name',
                     'cooking_time', 'created_at', 'added_in_favorites')
     readonly_fields = ('added_in_favorites',)
-    search_fields = ('text',)
+    search_fields = ('name', 'text')
     list_filter = ('author', 'name', 'tags')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE по search_fields.
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
     @display(description='Количество в избранных')
     def added_in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 class TagAdmin(admin.ModelAdmin):
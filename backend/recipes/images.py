@@ -0,0 +1,90 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix='recipe-images')
+    return _executor
+
+
+def get_thumbnail_format():
+    """WebP, если Pillow собран с его поддержкой, иначе JPEG."""
+    image_format = settings.RECIPE_THUMBNAIL_FORMAT.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def render_thumbnail(file):
+    image_format = get_thumbnail_format()
+    with Image.open(file) as image:
+        image.thumbnail(settings.RECIPE_THUMBNAIL_SIZE)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, quality=80)
+    return buffer.getvalue(), image_format.lower().replace('jpeg', 'jpg')
+
+
+def make_thumbnail(recipe_id):
+    """Создаёт миниатюру, если изображение рецепта не сменилось за это
+    время.
+
+    Если сменилось, записанный файл не удаляется: имена файлов зависят
+    только от содержимого, и та же миниатюра может быть у других рецептов.
+    Файлы без ссылок убирает manage.py collect_media.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    with recipe.image.open('rb') as file:
+        content, extension = render_thumbnail(file)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    field = Recipe._meta.get_field('thumbnail')
+    thumbnail = field.storage.save(
+        field.generate_filename(recipe, f'{stem}.{extension}'),
+        ContentFile(content))
+    Recipe.objects.filter(pk=recipe_id, image=source).update(
+        thumbnail=thumbnail)
+
+
+def run_in_background(recipe_id):
+    try:
+        make_thumbnail(recipe_id)
+    except Exception:
+        logger.exception('Не удалось обработать изображение рецепта %s',
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnail(recipe):
+    """Сбрасывает устаревшую миниатюру и ставит новую в очередь после
+    коммита; в синхронном режиме делает её сразу."""
+    Recipe.objects.filter(pk=recipe.pk).update(thumbnail='')
+    recipe.thumbnail = ''
+    if not recipe.image:
+        return
+    if not settings.IMAGE_PROCESSING_ASYNC:
+        make_thumbnail(recipe.pk)
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_in_background, recipe.pk))
@@ -0,0 +1,57 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import Recipe
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы изображений рецептов, на которые не ссылается '
+            'ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать файлы для удаления.')
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Не трогать файлы моложе N секунд: они могут '
+                                 'принадлежать незавершённой загрузке.')
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        fields = [Recipe._meta.get_field(name)
+                  for name in ('image', 'thumbnail')]
+        referenced = set()
+        for field in fields:
+            referenced.update(Recipe.objects.exclude(
+                **{field.name: ''}).values_list(field.name, flat=True))
+
+        removed = freed = 0
+        seen = set()
+        for field in fields:
+            storage = field.storage
+            directory = field.upload_to.rstrip('/')
+            if not storage.exists(directory):
+                continue
+            for name in walk(storage, directory):
+                if name in referenced or name in seen:
+                    continue
+                seen.add(name)
+                if storage.get_modified_time(name) > threshold:
+                    continue
+                removed += 1
+                freed += storage.size(name)
+                self.stdout.write(name)
+                if not options['dry_run']:
+                    storage.delete(name)
+        action = 'К удалению' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {removed}, {freed / 1024:.0f} КБ.'))
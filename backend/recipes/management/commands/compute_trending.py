@@ -0,0 +1,62 @@
+import heapq
+import math
+from collections import defaultdict
+from datetime import timedelta
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from recipes.models import Favourite, ShoppingCart, TrendingRecipe
+
+# Вес одного события: добавление в корзину ближе к «приготовлю»,
+# чем добавление в избранное.
+EVENT_WEIGHTS = ((Favourite, 1.0), (ShoppingCart, 2.0))
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает топ популярных рецептов по добавлениям '
+            'в избранное и корзину с экспоненциальным затуханием. '
+            'Рассчитан на запуск по расписанию, например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=float,
+                            default=settings.TRENDING_WINDOW_DAYS,
+                            help='Учитывать события за столько дней.')
+        parser.add_argument('--half-life', type=float,
+                            default=settings.TRENDING_HALF_LIFE_HOURS,
+                            help='Период полураспада вклада события, часы.')
+        parser.add_argument('--size', type=int,
+                            default=settings.TRENDING_SIZE,
+                            help='Сколько рецептов хранить в топе.')
+
+    def compute_scores(self, now, since, half_life):
+        """{recipe_id: сумма весов событий с множителем
+        2 ** (-возраст / half_life)} за один проход по событиям окна."""
+        rate = math.log(2) / half_life.total_seconds()
+        scores = defaultdict(float)
+        for model, weight in EVENT_WEIGHTS:
+            events = model.objects.filter(
+                created_at__gte=since).values_list('recipe_id', 'created_at')
+            for recipe_id, created_at in events.iterator(chunk_size=5000):
+                scores[recipe_id] += weight * math.exp(
+                    -rate * (now - created_at).total_seconds())
+        return scores
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=options['window'])
+        scores = self.compute_scores(
+            now, since, timedelta(hours=options['half_life']))
+        top = heapq.nlargest(options['size'], scores.items(),
+                             key=itemgetter(1))
+        with transaction.atomic():
+            TrendingRecipe.objects.all().delete()
+            TrendingRecipe.objects.bulk_create(
+                TrendingRecipe(recipe_id=recipe_id, score=score,
+                               computed_at=now)
+                for recipe_id, score in top
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Событий по {len(scores)} рецептам, в топе {len(top)}.'))
@@ -0,0 +1,86 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Ingredient
+
+HEADER = ('name', 'measurement_unit')
+JSON_SEPARATORS = '[, \t\r\n'
+
+
+def iter_csv(file):
+    """Строки CSV (name, measurement_unit); заголовок пропускается."""
+    for row in csv.reader(file):
+        if len(row) < 2:
+            continue
+        name, measurement_unit = row[0].strip(), row[1].strip()
+        if (name, measurement_unit) == HEADER:
+            continue
+        yield name, measurement_unit
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    """Объекты JSON-массива по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in iter(lambda: file.read(chunk_size), ''):
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip(JSON_SEPARATORS)
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            buffer = buffer[end:]
+            yield item['name'].strip(), item['measurement_unit'].strip()
+    if buffer.strip(JSON_SEPARATORS + ']'):
+        raise CommandError('Некорректный JSON-массив ингредиентов.')
+
+
+class Command(BaseCommand):
+    help = ('Загружает справочник ингредиентов из CSV или JSON пачками; '
+            'уже существующие пары (name, measurement_unit) пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=Path(settings.BASE_DIR).parent / 'data/ingredients.csv',
+            help='Путь к файлу (по умолчанию data/ingredients.csv).')
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help='Формат файла (по умолчанию по расширению).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        readers = {'csv': iter_csv, 'json': iter_json}
+        if file_format not in readers:
+            raise CommandError(f'Неизвестный формат: {file_format}.')
+        batch_size = options['batch_size']
+
+        before = Ingredient.objects.count()
+        started = time.monotonic()
+        processed = 0
+        with open(path, encoding='utf-8') as file:
+            rows = readers[file_format](file)
+            while True:
+                batch = [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                processed += len(batch)
+        elapsed = time.monotonic() - started
+        created = Ingredient.objects.count() - before
+        rate = processed / elapsed if elapsed else processed
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено: {created}, '
+            f'{rate:.0f} строк/с.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from recipes.images import make_thumbnail
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Синхронно создаёт миниатюры рецептов, у которых их нет '
+            '(например, если процесс остановился до конца обработки).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать миниатюры всех рецептов.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(thumbnail='')
+        processed = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            make_thumbnail(recipe_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}.'))
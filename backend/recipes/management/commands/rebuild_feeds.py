@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from recipes.models import FeedEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок по текущим подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя; по умолчанию все ленты.')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        if users is not None:
+            users = User.objects.filter(pk__in=users)
+        FeedEntry.objects.rebuild(users)
+        entries = FeedEntry.objects.all()
+        if users is not None:
+            entries = entries.filter(user__in=users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны: {entries.count()} записей.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.search import is_supported, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько рецептов индексировать за один проход.')
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stderr.write('Поиск по индексу не поддерживается этой БД.')
+            return
+        batch_size = options['batch_size']
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        for start in range(0, len(recipe_ids), batch_size):
+            update_search_index(recipe_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {len(recipe_ids)}.'))
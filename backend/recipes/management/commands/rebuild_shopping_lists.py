@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Проверяет агрегированные списки покупок по корзинам '
+            'и пересобирает их с нуля.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сообщить о расхождениях, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        expected = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total
+            in ShoppingListItem.objects.aggregate_from_carts()
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount')
+        }
+        mismatched = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        for user_id, ingredient_id in sorted(mismatched):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'{stored.get((user_id, ingredient_id))} != '
+                f'{expected.get((user_id, ingredient_id))}')
+        self.stdout.write(f'Расхождений: {len(mismatched)}')
+        if options['check']:
+            return
+        ShoppingListItem.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: {len(expected)} позиций.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from recipes.models import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики рецептов и пользователей '
+            'с данными и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сообщить о расхождениях, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_counters(fix=not options['check'])
+        for obj, field, stored, actual in mismatches:
+            self.stdout.write(f'{obj._meta.model_name}={obj.pk} {field}: '
+                              f'{stored} != {actual}')
+        self.stdout.write(f'Расхождений: {len(mismatches)}')
+        if mismatches and not options['check']:
+            self.stdout.write(self.style.SUCCESS('Счётчики исправлены.'))
@@ -0,0 +1,148 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import (Favourite, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            Tag, reconcile_counters)
+from recipes.search import update_search_index
+from users.models import Subscribe
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench_'
+BENCH_PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетические данные для нагрузочных замеров API: '
+            'пользователей bench_*, их рецепты, избранное, корзины и '
+            'подписки. Вставка идёт пачками через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='Минимальный размер справочника.')
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=10)
+        parser.add_argument('--subscriptions-per-user', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить ранее созданные данные bench_*.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        with transaction.atomic():
+            ingredient_ids = self.create_ingredients(options['ingredients'])
+            tag_ids = self.create_tags(options['tags'])
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                user_ids, options['recipes_per_user'])
+            self.create_recipe_relations(
+                recipe_ids, ingredient_ids, tag_ids,
+                options['ingredients_per_recipe'])
+            self.create_user_relations(
+                Favourite, user_ids, recipe_ids,
+                options['favorites_per_user'])
+            self.create_user_relations(
+                ShoppingCart, user_ids, recipe_ids, options['cart_per_user'])
+            self.create_subscriptions(
+                user_ids, options['subscriptions_per_user'])
+            # bulk_create не вызывает сигналов: производные данные
+            # пересчитываются явно.
+            ShoppingListItem.objects.rebuild(users=user_ids)
+            reconcile_counters()
+            FeedEntry.objects.rebuild(users=user_ids)
+            update_search_index(recipe_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, рецептов: {len(recipe_ids)}.'))
+
+    def sample(self, population, size):
+        return self.random.sample(population, min(size, len(population)))
+
+    def create_ingredients(self, total):
+        missing = total - Ingredient.objects.count()
+        if missing > 0:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=f'{BENCH_PREFIX}ингредиент {index}',
+                            measurement_unit='г')
+                 for index in range(missing)),
+                batch_size=self.batch_size, ignore_conflicts=True)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_tags(self, total):
+        existing = Tag.objects.count()
+        Tag.objects.bulk_create(
+            (Tag(name=f'{BENCH_PREFIX}tag {index}',
+                 color=f'#{index:06x}',
+                 slug=f'{BENCH_PREFIX}tag-{index}')
+             for index in range(existing, total)),
+            batch_size=self.batch_size, ignore_conflicts=True)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, total):
+        start = User.objects.filter(username__startswith=BENCH_PREFIX).count()
+        password = make_password(BENCH_PASSWORD)
+        User.objects.bulk_create(
+            (User(username=f'{BENCH_PREFIX}{index}',
+                  email=f'{BENCH_PREFIX}{index}@example.com',
+                  first_name='Bench', last_name=str(index),
+                  password=password)
+             for index in range(start, start + total)),
+            batch_size=self.batch_size)
+        return list(User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('id').values_list('id', flat=True)[start:])
+
+    def create_recipes(self, user_ids, per_user):
+        Recipe.objects.bulk_create(
+            (Recipe(author_id=user_id,
+                    name=f'Рецепт {user_id}-{index}',
+                    text='Синтетический рецепт для замеров. ' * 10,
+                    image='recipes/temp.png',
+                    cooking_time=self.random.randint(1, 180))
+             for user_id in user_ids for index in range(per_user)),
+            batch_size=self.batch_size)
+        return list(Recipe.objects.filter(
+            author_id__in=user_ids).values_list('id', flat=True))
+
+    def create_recipe_relations(self, recipe_ids, ingredient_ids, tag_ids,
+                                per_recipe):
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                              amount=self.random.randint(1, 500))
+             for recipe_id in recipe_ids
+             for ingredient_id in self.sample(ingredient_ids, per_recipe)),
+            batch_size=self.batch_size)
+        recipe_tags = Recipe.tags.through
+        recipe_tags.objects.bulk_create(
+            (recipe_tags(recipe_id=recipe_id, tag_id=tag_id)
+             for recipe_id in recipe_ids
+             for tag_id in self.sample(tag_ids, self.random.randint(1, 3))),
+            batch_size=self.batch_size, ignore_conflicts=True)
+
+    def create_user_relations(self, model, user_ids, recipe_ids, per_user):
+        model.objects.bulk_create(
+            (model(user_id=user_id, recipe_id=recipe_id)
+             for user_id in user_ids
+             for recipe_id in self.sample(recipe_ids, per_user)),
+            batch_size=self.batch_size, ignore_conflicts=True)
+
+    def create_subscriptions(self, user_ids, per_user):
+        Subscribe.objects.bulk_create(
+            (Subscribe(user_id=user_id, author_id=author_id)
+             for user_id in user_ids
+             for author_id in self.sample(user_ids, per_user + 1)
+             if author_id != user_id),
+            batch_size=self.batch_size, ignore_conflicts=True)
@@ -0,0 +1,32 @@
+from django.db import migrations
+from recipes.search import (collect_documents, create_search_table,
+                            drop_search_table, write_documents)
+
+BATCH_SIZE = 500
+
+
+def create_index(apps, schema_editor):
+    create_search_table(schema_editor)
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        write_documents(
+            schema_editor.connection, batch,
+            collect_documents(Recipe, RecipeIngredient, batch))
+
+
+def drop_index(apps, schema_editor):
+    drop_search_table(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
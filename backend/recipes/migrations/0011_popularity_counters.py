@@ -0,0 +1,44 @@
+# Generated by Django 3.2 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favourite = apps.get_model('recipes', 'Favourite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    for model, field in ((Favourite, 'favorites_count'),
+                         (ShoppingCart, 'in_carts_count')):
+        counts = model.objects.filter(recipe=models.OuterRef('pk')).order_by(
+        ).values('recipe').annotate(total=models.Count('pk')).values('total')
+        Recipe.objects.filter(
+            models.Exists(model.objects.filter(recipe=models.OuterRef('pk')))
+        ).update(**{field: models.Subquery(counts)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-created_at', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.RunPython(
+            fill_counters,
+            migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+from recipes.search import drop_search_foreign_key
+
+
+def drop_foreign_key(apps, schema_editor):
+    drop_search_foreign_key(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_foreign_key, migrations.RunPython.noop),
+    ]
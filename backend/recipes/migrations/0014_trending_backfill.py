@@ -0,0 +1,38 @@
+import datetime
+
+from django.db import migrations, models
+
+UNKNOWN_CREATED_AT = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def age_backfilled_events(apps, schema_editor):
+    """Отодвигает за окно compute_trending строки, которым прежняя
+    версия 0012_trending проставила время миграции.
+
+    Эти строки - все, что были до неё, - получили одно и то же
+    created_at, минимальное в таблице; настоящие события с точно
+    совпадающим временем не встречаются.
+    """
+    for name in ('Favourite', 'ShoppingCart'):
+        model = apps.get_model('recipes', name)
+        earliest = model.objects.aggregate(
+            earliest=models.Min('created_at'))['earliest']
+        if earliest is None:
+            continue
+        backfilled = model.objects.filter(created_at=earliest)
+        if backfilled.count() > 1:
+            backfilled.update(created_at=UNKNOWN_CREATED_AT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_search_without_foreign_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            age_backfilled_events,
+            migrations.RunPython.noop
+        ),
+    ]
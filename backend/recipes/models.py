@@ -1,7 +1,14 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import UniqueConstraint
-from users.models import User
+from django.db import models, transaction
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Subquery,
+                              Sum, UniqueConstraint)
+from django.db.models.functions import Coalesce, Greatest
+from users.models import Subscribe, User
+
+from .storage import ContentAddressedStorage
 
 
 class Ingredient(models.Model):
@@ -13,6 +20,10 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            UniqueConstraint(fields=['name', 'measurement_unit'],
+                             name='unique_ingredient')
+        ]
 
     def __str__(self):
         return f'{self.name} {self.measurement_unit}'
@@ -29,6 +40,46 @@ class Tag(models.Model):
         return self.name
 
 
+def recipe_content_lookups():
+    """Связи рецепта, которые отдаются в ответе: тэги и ингредиенты."""
+    return (
+        'tags',
+        Prefetch('recipeingredient_set',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient')),
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для чтения без N+1 запросов."""
+
+    def with_related(self, user=None, content=True):
+        """Авторы с флагом подписки и, если content, тэги с ингредиентами.
+
+        content=False оставляет загрузку тэгов и ингредиентов сериализатору,
+        который берёт их из кэша и догружает только промахи.
+        """
+        authors = User.objects.all()
+        if user is not None and user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Subscribe.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        queryset = self.prefetch_related(Prefetch('author', queryset=authors))
+        if content:
+            queryset = queryset.prefetch_related(*recipe_content_lookups())
+        return queryset
+
+    def with_user_flags(self, user):
+        if user is None or user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=Exists(Favourite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+
 class Recipe(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название рецепта')
     author = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -36,7 +87,13 @@ class Recipe(models.Model):
                                verbose_name='Автор рецепта',
                                db_index=True)
     text = models.TextField(verbose_name='Описание рецепта')
-    image = models.ImageField(upload_to='recipes/', verbose_name='Изображение')
+    image = models.ImageField(upload_to='recipes/',
+                              storage=ContentAddressedStorage(),
+                              verbose_name='Изображение')
+    thumbnail = models.ImageField(upload_to='recipes/thumbnails/',
+                                  storage=ContentAddressedStorage(),
+                                  blank=True, editable=False,
+                                  verbose_name='Миниатюра')
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления (в минутах)',
         validators=[MinValueValidator(1, message='Мин значение 1!')])
@@ -51,15 +108,40 @@ class Recipe(models.Model):
     created_at = models.DateTimeField(auto_now_add=True,
                                       verbose_name='Дата публикации',
                                       db_index=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В корзинах')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['author', '-created_at'],
+                         name='recipe_author_created_idx'),
+            models.Index(fields=['-created_at', '-id'],
+                         name='recipe_created_id_idx'),
+            models.Index(fields=['-favorites_count', '-created_at', '-id'],
+                         name='recipe_popular_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+    @property
+    def image_changed(self):
+        """Изображение новое или заменено с момента загрузки из базы."""
+        return self.image.name != getattr(self, '_loaded_image', None)
+
 
 class RecipeIngredient(models.Model):
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
@@ -91,6 +173,8 @@ class Favourite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Дата добавления')
 
     def __str__(self):
         return f'Избранный {self.recipe} у {self.user}'
@@ -102,9 +186,17 @@ class Favourite(models.Model):
                 name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='favourite_recipe_user_idx'),
+            models.Index(fields=['created_at'],
+                         name='favourite_created_idx'),
+        ]
         verbose_name = 'Объект избранного'
         verbose_name_plural = 'Объекты избранного'
 
+    counter_field = 'favorites_count'
+
 
 class ShoppingCart(models.Model):
     user = models.ForeignKey(
@@ -119,6 +211,8 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Дата добавления')
 
     class Meta:
         verbose_name = 'Корзина покупок'
@@ -127,6 +221,324 @@ class ShoppingCart(models.Model):
             UniqueConstraint(fields=['user', 'recipe'],
                              name='unique_shopping_cart')
         ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='cart_recipe_user_idx'),
+            models.Index(fields=['created_at'], name='cart_created_idx'),
+        ]
+
+    counter_field = 'in_carts_count'
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Корзину покупок'
+
+
+def counter_delta(field, delta):
+    """F()-выражение счётчика field, изменённого на delta, но не ниже нуля."""
+    if delta >= 0:
+        return F(field) + delta
+    return Greatest(F(field) + delta, 0)
+
+
+def bump_counter(model, pk, field, delta=1):
+    """Атомарно меняет денормализованный счётчик field объекта pk."""
+    model.objects.filter(pk=pk).update(**{field: counter_delta(field, delta)})
+
+
+def reconcile_counters(fix=True):
+    """Сверяет денормализованные счётчики с данными.
+
+    Возвращает [(объект, счётчик, сохранённое, настоящее значение)] для
+    расхождений и, если fix, исправляет их.
+    """
+    counters = (
+        (Recipe, 'favorites_count', Favourite, 'recipe'),
+        (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'subscribers_count', Subscribe, 'author'),
+    )
+    mismatches = []
+    for model, field, source, relation in counters:
+        counts = source.objects.filter(
+            **{relation: OuterRef('pk')}
+        ).order_by().values(relation).annotate(
+            total=Count('pk')).values('total')
+        mismatched = list(model.objects.annotate(
+            actual=Coalesce(Subquery(counts), 0)
+        ).exclude(**{field: F('actual')}).only('pk', field))
+        for obj in mismatched:
+            mismatches.append((obj, field, getattr(obj, field), obj.actual))
+            setattr(obj, field, obj.actual)
+        if fix:
+            model.objects.bulk_update(mismatched, [field], batch_size=1000)
+    return mismatches
+
+
+def recipe_amounts(recipe):
+    """Количество каждого ингредиента в рецепте: {ingredient_id: amount}."""
+    amounts = defaultdict(int)
+    for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+class ShoppingListManager(models.Manager):
+    """Инкрементальное обновление агрегированного списка покупок."""
+
+    def apply_delta(self, user_ids, deltas):
+        """Прибавляет deltas {ingredient_id: amount} к спискам user_ids."""
+        deltas = {key: value for key, value in deltas.items() if value}
+        user_ids = list(user_ids)
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            # select_for_update ниже блокирует только существующие позиции;
+            # блокировка строк пользователей (в порядке pk, без взаимных
+            # блокировок) не даёт двум транзакциям создать одну позицию.
+            list(User.objects.select_for_update().filter(
+                pk__in=user_ids).order_by('pk').values_list('pk'))
+            existing = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=deltas)
+            }
+            to_create, to_update, to_delete = [], [], []
+            for user_id in user_ids:
+                for ingredient_id, delta in deltas.items():
+                    item = existing.get((user_id, ingredient_id))
+                    if item is None:
+                        if delta > 0:
+                            to_create.append(self.model(
+                                user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                amount=delta))
+                        continue
+                    item.amount += delta
+                    if item.amount > 0:
+                        to_update.append(item)
+                    else:
+                        to_delete.append(item.pk)
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, ['amount'])
+            self.filter(pk__in=to_delete).delete()
+
+    def add_recipe(self, user, recipe):
+        self.apply_delta([user.pk], recipe_amounts(recipe))
+
+    def remove_recipe(self, user, recipe):
+        amounts = recipe_amounts(recipe)
+        self.apply_delta([user.pk], {key: -value
+                                     for key, value in amounts.items()})
+
+    def update_recipe(self, recipe, old_amounts, new_amounts):
+        """Применяет изменение состава рецепта ко всем корзинам с ним."""
+        deltas = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in set(old_amounts) | set(new_amounts)
+        }
+        user_ids = ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True)
+        self.apply_delta(user_ids, deltas)
+
+    def delete_recipe(self, recipe):
+        self.update_recipe(recipe, recipe_amounts(recipe), {})
+
+    def aggregate_from_carts(self, users=None):
+        """Список покупок, посчитанный заново по корзинам."""
+        queryset = ShoppingCart.objects.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        return queryset.values(
+            'user_id',
+            ingredient_id=F('recipe__recipeingredient__ingredient'),
+        ).annotate(
+            total=Sum('recipe__recipeingredient__amount')
+        ).filter(total__gt=0).values_list('user_id', 'ingredient_id',
+                                          'total')
+
+    def rebuild(self, users=None):
+        with transaction.atomic():
+            stale = self.all()
+            if users is not None:
+                stale = stale.filter(user__in=users)
+            stale.delete()
+            self.bulk_create(
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=total)
+                for user_id, ingredient_id, total
+                in self.aggregate_from_carts(users)
+            )
+
+
+class ShoppingListItem(models.Model):
+    """Агрегированный список покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(verbose_name='Общее количество')
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            UniqueConstraint(fields=['user', 'ingredient'],
+                             name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class FeedManager(models.Manager):
+    """Ленты подписок, которые заполняются при публикации рецепта.
+
+    Рецепты авторов, у которых больше FEED_FANOUT_LIMIT подписчиков, по
+    лентам не раскладываются: они подмешиваются при чтении, см.
+    unfanned_recipes. Когда число подписчиков опускается до лимита, такие
+    рецепты дописываются в ленты, см. backfill.
+    """
+    batch_size = 1000
+
+    def is_fanned_out(self, author_id):
+        return not User.objects.filter(
+            pk=author_id,
+            subscribers_count__gt=settings.FEED_FANOUT_LIMIT).exists()
+
+    def _add(self, pairs):
+        self.bulk_create(
+            (self.model(user_id=user_id, recipe_id=recipe_id,
+                        created_at=created_at)
+             for user_id, recipe_id, created_at in pairs),
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+
+    def fan_out(self, recipe):
+        """Раскладывает новый рецепт по лентам подписчиков автора."""
+        if not self.is_fanned_out(recipe.author_id):
+            return
+        followers = Subscribe.objects.filter(
+            author_id=recipe.author_id).values_list('user_id', flat=True)
+        self._add((user_id, recipe.pk, recipe.created_at)
+                  for user_id in followers.iterator())
+
+    def follow(self, user_id, author_id):
+        """Добавляет в ленту рецепты автора, на которого подписались."""
+        if not self.is_fanned_out(author_id):
+            return
+        recipes = Recipe.objects.filter(
+            author_id=author_id).values_list('pk', 'created_at')
+        self._add((user_id, recipe_id, created_at)
+                  for recipe_id, created_at in recipes.iterator())
+
+    def backfill(self, author_id):
+        """Раскладывает по лентам подписчиков все рецепты автора, который
+        снова в пределах FEED_FANOUT_LIMIT: рецепты, вышедшие сверх
+        лимита, в ленты не попали."""
+        if not self.is_fanned_out(author_id):
+            return
+        followers = list(Subscribe.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True))
+        recipes = Recipe.objects.filter(
+            author_id=author_id).values_list('pk', 'created_at')
+        self._add((user_id, recipe_id, created_at)
+                  for recipe_id, created_at in recipes.iterator()
+                  for user_id in followers)
+
+    def unfollow(self, user_id, author_id):
+        self.filter(user_id=user_id, recipe__author_id=author_id).delete()
+
+    def unfanned_recipes(self, user):
+        """Рецепты авторов из подписок user, которых нет в лентах."""
+        authors = Subscribe.objects.filter(
+            user=user,
+            author__subscribers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values('author')
+        return Recipe.objects.filter(author__in=authors)
+
+    def rebuild(self, users=None):
+        subscriptions = Subscribe.objects.all()
+        stale = self.all()
+        if users is not None:
+            subscriptions = subscriptions.filter(user__in=users)
+            stale = stale.filter(user__in=users)
+        with transaction.atomic():
+            stale.delete()
+            for user_id, author_id in subscriptions.values_list(
+                    'user_id', 'author_id'):
+                self.follow(user_id, author_id)
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    # Копия Recipe.created_at: лента листается по индексу этой таблицы.
+    created_at = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = FeedManager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            UniqueConstraint(fields=['user', 'recipe'],
+                             name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-recipe'],
+                         name='feed_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class TrendingRecipe(models.Model):
+    """Рецепт из топа популярных за последнее время.
+
+    Таблица целиком пересчитывается командой compute_trending, поэтому
+    эндпоинт читает готовый топ по индексу.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(verbose_name='Оценка')
+    computed_at = models.DateTimeField(verbose_name='Дата расчёта')
+
+    class Meta:
+        ordering = ('-score',)
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),
+        ]
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+
+    def __str__(self):
+        return f'{self.recipe}: {self.score:.2f}'
@@ -0,0 +1,258 @@
+"""Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+Индекс живёт в отдельной таблице: на SQLite это виртуальная таблица FTS5
+с текстом, заранее приведённым к основам слов, на PostgreSQL -- tsvector
+с конфигурацией russian и GIN-индексом.
+"""
+import re
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'recipes_recipe_search'
+# Веса названия, описания и ингредиентов для bm25 в SQLite.
+SQLITE_WEIGHTS = (10.0, 1.0, 4.0)
+
+_VOWELS = 'аеиоуыэюя'
+_WORD_RE = re.compile(r'\w+')
+_CYRILLIC_RE = re.compile(r'^[а-я]+$')
+
+_PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                      ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+_ADJECTIVE = (('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой',
+               'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их',
+               'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'),)
+_PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+_REFLEXIVE = (('ся', 'сь'),)
+_VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+          'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+         ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+          'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+          'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+_NOUN = (('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+          'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+          'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+          'ья', 'я'),)
+_SUPERLATIVE = (('ейш', 'ейше'),)
+
+
+def _region(word, start):
+    """Начало области после первой согласной, идущей за гласной."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _remove(rv, groups):
+    """Отрезает самое длинное окончание; у первой группы окончаний
+    перед ним должна стоять «а» или «я». None, если отрезать нечего."""
+    matches = [
+        (len(ending), index)
+        for index, endings in enumerate(groups)
+        for ending in endings if rv.endswith(ending)
+    ]
+    if not matches:
+        return None
+    length, index = max(matches)
+    rest = rv[:-length]
+    if len(groups) > 1 and index == 0 and not rest.endswith(('а', 'я')):
+        return None
+    return rest
+
+
+def _remove_adjectival(rv):
+    rest = _remove(rv, _ADJECTIVE)
+    if rest is None:
+        return None
+    participle = _remove(rest, _PARTICIPLE)
+    return rest if participle is None else participle
+
+
+def _remove_ending(rv):
+    """Шаг 1: деепричастие или возвратная частица с окончанием
+    прилагательного, глагола или существительного."""
+    rest = _remove(rv, _PERFECTIVE_GERUND)
+    if rest is not None:
+        return rest
+    reflexive = _remove(rv, _REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    for rest in (_remove_adjectival(rv), _remove(rv, _VERB),
+                 _remove(rv, _NOUN)):
+        if rest is not None:
+            return rest
+    return rv
+
+
+def _tidy_up(rv):
+    """Шаг 4: превосходная степень, двойное «н» и мягкий знак."""
+    superlative = _remove(rv, _SUPERLATIVE)
+    if superlative is not None:
+        rv = superlative
+    if rv.endswith('нн'):
+        return rv[:-1]
+    if superlative is None and rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Портера (Snowball)."""
+    word = word.lower().replace('ё', 'е')
+    if not _CYRILLIC_RE.match(word):
+        return word
+    rv_start = next(
+        (i + 1 for i, char in enumerate(word) if char in _VOWELS), len(word))
+    r2 = _region(word, _region(word, 0))
+    prefix = word[:rv_start]
+    rv = _remove_ending(word[rv_start:])
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    for ending in ('ость', 'ост'):
+        if rv.endswith(ending) and len(prefix) + len(rv) - len(ending) >= r2:
+            rv = rv[:-len(ending)]
+            break
+    return prefix + _tidy_up(rv)
+
+
+def normalize(text):
+    """Текст как строка основ слов через пробел."""
+    return ' '.join(stem(word) for word in _WORD_RE.findall(text or ''))
+
+
+def is_supported(conn=connection):
+    return conn.vendor in ('sqlite', 'postgresql')
+
+
+def create_search_table(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+            f'name, text, ingredients, '
+            f"tokenize = 'unicode61 remove_diacritics 2')")
+    elif vendor == 'postgresql':
+        # Без внешнего ключа на recipes_recipe: Django не знает об этой
+        # таблице, и TRUNCATE при flush упал бы на ссылке. Записи
+        # удалённых рецептов убирает сигнал unindex_recipe.
+        schema_editor.execute(
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            f'recipe_id bigint PRIMARY KEY, '
+            f'document tsvector NOT NULL)')
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_document_idx '
+            f'ON {SEARCH_TABLE} USING GIN (document)')
+
+
+def drop_search_foreign_key(schema_editor):
+    """Снимает внешний ключ, с которым таблица создавалась раньше."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'ALTER TABLE {SEARCH_TABLE} '
+            f'DROP CONSTRAINT IF EXISTS {SEARCH_TABLE}_recipe_id_fkey')
+
+
+def drop_search_table(schema_editor):
+    if is_supported(schema_editor.connection):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def collect_documents(recipe_model, recipe_ingredient_model, recipe_ids):
+    """(id, название, описание, ингредиенты) для рецептов recipe_ids."""
+    ingredients = defaultdict(list)
+    for recipe_id, name in recipe_ingredient_model.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient__name'):
+        ingredients[recipe_id].append(name)
+    return [
+        (pk, name, text, ' '.join(ingredients[pk]))
+        for pk, name, text in recipe_model.objects.filter(
+            pk__in=recipe_ids).values_list('pk', 'name', 'text')
+    ]
+
+
+def write_documents(conn, recipe_ids, documents):
+    """Заменяет записи индекса recipe_ids на documents."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not is_supported(conn):
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids)
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, text, ingredients) '
+                f'VALUES (%s, %s, %s, %s)',
+                [(pk, normalize(name), normalize(text), normalize(names))
+                 for pk, name, text, names in documents])
+            return
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} '
+            f'WHERE recipe_id IN ({placeholders})', recipe_ids)
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) VALUES (%s, '
+            f"setweight(to_tsvector('russian', %s), 'A') || "
+            f"setweight(to_tsvector('russian', %s), 'B') || "
+            f"setweight(to_tsvector('russian', %s), 'C'))",
+            [(pk, name, names, text) for pk, name, text, names in documents])
+
+
+def update_search_index(recipe_ids):
+    from .models import Recipe, RecipeIngredient
+
+    recipe_ids = list(recipe_ids)
+    documents = collect_documents(Recipe, RecipeIngredient, recipe_ids)
+    write_documents(connection, recipe_ids, documents)
+
+
+def schedule_search_update(recipe_ids):
+    """Переиндексирует рецепты после коммита, когда уже сохранены
+    их ингредиенты."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: update_search_index(recipe_ids))
+
+
+def remove_from_search_index(recipe_ids):
+    write_documents(connection, recipe_ids, [])
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под все слова query, с аннотацией search_rank
+    и сортировкой по ней."""
+    words = [stem(word) for word in _WORD_RE.findall(query)]
+    if not words:
+        return queryset
+    if not is_supported():
+        condition = Q()
+        for word in _WORD_RE.findall(query):
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return queryset.filter(condition)
+
+    opts = queryset.model._meta
+    recipe_id = '{}.{}'.format(connection.ops.quote_name(opts.db_table),
+                               connection.ops.quote_name(opts.pk.column))
+    if connection.vendor == 'sqlite':
+        params = [' '.join(f'"{word}"' for word in words)]
+        matched = (f'SELECT rowid FROM {SEARCH_TABLE} '
+                   f'WHERE {SEARCH_TABLE} MATCH %s')
+        weights = ', '.join(map(str, SQLITE_WEIGHTS))
+        rank = (f'SELECT -bm25({SEARCH_TABLE}, {weights}) '
+                f'FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = {recipe_id}')
+    else:
+        params = [query]
+        matched = (f'SELECT recipe_id FROM {SEARCH_TABLE} '
+                   f"WHERE document @@ plainto_tsquery('russian', %s)")
+        rank = (f"SELECT ts_rank(document, plainto_tsquery('russian', %s)) "
+                f'FROM {SEARCH_TABLE} WHERE recipe_id = {recipe_id}')
+    return queryset.filter(
+        pk__in=RawSQL(matched, params)
+    ).annotate(
+        search_rank=RawSQL(rank, params, output_field=FloatField())
+    ).order_by('-search_rank', *opts.ordering, '-pk')
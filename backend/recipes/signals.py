@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from users.models import Subscribe, User
+
+from .images import schedule_thumbnail
+from .models import (Favourite, FeedEntry, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, ShoppingListItem,
+                     bump_counter, counter_delta)
+from .search import remove_from_search_index, schedule_search_update
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image_changed:
+        return
+    instance._loaded_image = instance.image.name
+    schedule_thumbnail(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_search_update([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    # Корзины с рецептом удаляются каскадом, в том числе из админки и
+    # вместе с автором, поэтому списки покупок уменьшаются заранее, пока
+    # состав рецепта и корзины ещё в базе.
+    ShoppingListItem.objects.delete_recipe(instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, raw=False,
+                               **kwargs):
+    if created or raw:
+        return
+    schedule_search_update(RecipeIngredient.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: FeedEntry.objects.fan_out(instance))
+
+
+@receiver(post_save, sender=Subscribe)
+def follow_author(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FeedEntry.objects.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def unfollow_author(sender, instance, **kwargs):
+    FeedEntry.objects.unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_counter(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def uncount_recipe(sender, instance, **kwargs):
+    bump_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def count_subscriber(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_counter(User, instance.author_id, 'subscribers_count')
+
+
+@receiver(post_delete, sender=Subscribe)
+def uncount_subscriber(sender, instance, **kwargs):
+    # Строка автора блокируется, чтобы из параллельных отписок ровно одна
+    # увидела переход через FEED_FANOUT_LIMIT вниз и дополнила ленты.
+    author_id = instance.author_id
+    count = User.objects.select_for_update().filter(
+        pk=author_id).values_list('subscribers_count', flat=True).first()
+    bump_counter(User, author_id, 'subscribers_count', -1)
+    if count == settings.FEED_FANOUT_LIMIT + 1:
+        transaction.on_commit(lambda: FeedEntry.objects.backfill(author_id))
+
+
+@receiver(pre_delete, sender=User)
+def uncount_user_recipes(sender, instance, **kwargs):
+    # Избранное и корзина удаляются каскадом без обхода
+    # RecipesViewSet.delete_from, поэтому счётчики рецептов
+    # уменьшаются здесь, по одному UPDATE на таблицу.
+    for model in (Favourite, ShoppingCart):
+        field = model.counter_field
+        Recipe.objects.filter(pk__in=model.objects.filter(
+            user=instance).values('recipe')).update(
+                **{field: counter_delta(field, -1)})
@@ -0,0 +1,114 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.test import APIClient
+
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(
+        django_db_modify_db_settings_parallel_suffix, tmp_path_factory):
+    # Тесты гонок ходят в базу из нескольких потоков, а общая in-memory
+    # база SQLite отвечает им «table is locked» вместо ожидания блокировки.
+    database = settings.DATABASES['default']
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        database['TEST'] = {
+            **database.get('TEST', {}),
+            'NAME': str(tmp_path_factory.mktemp('db') / 'test.sqlite3'),
+        }
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def fast_password_hasher(settings):
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='user@example.com', username='user', first_name='Иван',
+        last_name='Иванов', password='password')
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create_user(
+        email='author@example.com', username='author', first_name='Пётр',
+        last_name='Петров', password='password')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def client_for():
+    def client_for(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+    return client_for
+
+
+@pytest.fixture
+def anon_client():
+    return APIClient()
+
+
+@pytest.fixture
+def tags():
+    return [
+        Tag.objects.create(name=f'Тэг {index}', color=f'#00000{index}',
+                           slug=f'test-tag-{index}')
+        for index in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients():
+    return [
+        Ingredient.objects.create(name=f'ингредиент {index}',
+                                  measurement_unit='г')
+        for index in range(5)
+    ]
+
+
+@pytest.fixture
+def make_recipe(author, tags, ingredients):
+    def make_recipe(author=author, tags=tags[:2], amounts=(1, 2, 3),
+                    name='Рецепт'):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание',
+            image='recipes/test.png', cooking_time=10)
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in zip(ingredients, amounts)
+        )
+        return recipe
+    return make_recipe
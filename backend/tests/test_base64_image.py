@@ -0,0 +1,129 @@
+import base64
+import io
+import tracemalloc
+
+import pytest
+from api.serializers import Base64ImageField
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+
+def make_png(size):
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 50).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_image(image_format, **params):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, image_format, **params)
+    return buffer.getvalue()
+
+
+def data_url(raw, image_format='png'):
+    return (f'data:image/{image_format};base64,'
+            + base64.b64encode(raw).decode())
+
+
+def mime_data_url(raw, line_length=76):
+    encoded = base64.b64encode(raw).decode()
+    lines = [encoded[index:index + line_length]
+             for index in range(0, len(encoded), line_length)]
+    return 'data:image/png;base64,' + '\r\n'.join(lines)
+
+
+def decode(data):
+    return Base64ImageField().to_internal_value(data)
+
+
+def error_codes(data):
+    with pytest.raises(ValidationError) as error:
+        decode(data)
+    return [detail.code for detail in error.value.detail]
+
+
+def test_decodes_image():
+    raw = make_png((64, 64))
+    file = decode(data_url(raw))
+    assert file.name == 'temp.png'
+    assert file.read() == raw
+
+
+@pytest.mark.parametrize('image_format, params, name', [
+    ('JPEG', {}, 'temp.jpg'),
+    ('MPO', {'save_all': True,
+             'append_images': [Image.new('RGB', (8, 8))]}, 'temp.jpg'),
+    ('GIF', {}, 'temp.gif'),
+])
+def test_file_extension_by_format(image_format, params, name):
+    assert decode(data_url(make_image(image_format, **params))).name == name
+
+
+def test_rejects_unsupported_format():
+    assert error_codes(data_url(make_image('BMP'))) == ['unsupported_format']
+
+
+def test_decodes_mime_wrapped_base64():
+    raw = make_png((300, 300))
+    assert mime_data_url(raw).count('\r\n') > 100
+    assert decode(mime_data_url(raw)).read() == raw
+
+
+@pytest.mark.parametrize('line_length', [1, 3, 5, 76])
+def test_decodes_any_line_length(monkeypatch, line_length):
+    # Маленькие части, чтобы переносы попадали на их границы.
+    monkeypatch.setattr(Base64ImageField, 'chunk_size', 7)
+    raw = make_png((8, 8))
+    assert decode(mime_data_url(raw, line_length)).read() == raw
+
+
+def test_memory_does_not_grow_with_payload(settings):
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 64 * 1024
+    raw = make_png((1000, 1000))
+    data = mime_data_url(raw)
+    tracemalloc.start()
+    try:
+        file = decode(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(raw) > 512 * 1024
+    # Копии всей строки или всего изображения в памяти не создаются.
+    assert peak < len(raw) / 4
+    assert file.read() == raw
+
+
+def test_rejects_too_large_before_decoding(settings):
+    settings.RECIPE_IMAGE_MAX_SIZE = 1000
+    assert error_codes(
+        'data:image/png;base64,' + 'A' * 2000) == ['too_large']
+
+
+def test_rejects_too_large_with_whitespace(settings):
+    raw = make_png((64, 64))
+    settings.RECIPE_IMAGE_MAX_SIZE = len(raw) - 1
+    data = data_url(raw).replace('A', 'A ')
+    assert error_codes(data) == ['too_large']
+
+
+def test_accepts_size_limit_with_line_breaks(settings):
+    raw = make_png((64, 64))
+    settings.RECIPE_IMAGE_MAX_SIZE = len(raw)
+    assert decode(mime_data_url(raw, 10)).read() == raw
+
+
+@pytest.mark.parametrize('data', [
+    'data:image/png;base64,' + base64.b64encode(b'not an image').decode(),
+    data_url(make_png((16, 16))[:100]),
+])
+def test_rejects_non_image(data):
+    assert error_codes(data) == ['invalid_image']
+
+
+@pytest.mark.parametrize('data', [
+    'data:image/png;base64,!!!!',
+    'data:image/png;base64,QUJDRA',
+    'data:image/png,QUJD',
+])
+def test_rejects_invalid_base64(data):
+    assert error_codes(data) == ['invalid_base64']
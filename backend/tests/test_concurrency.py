@@ -0,0 +1,142 @@
+import threading
+from unittest import skipIf
+
+from django.db import connection
+from django.test import TransactionTestCase
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem)
+from rest_framework.test import APIClient
+from users.models import User
+
+
+def run_concurrently(calls):
+    """Запускает calls одновременно, каждую в своём потоке, и возвращает
+    их результаты."""
+    barrier = threading.Barrier(len(calls))
+    results = []
+
+    def run(call):
+        barrier.wait()
+        try:
+            results.append(call())
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(call,)) for call in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def post_as(user, url, data=None, method='post'):
+    client = APIClient()
+    client.force_authenticate(user)
+    return getattr(client, method)(url, data, format='json').status_code
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, first_name=name,
+        last_name=name, password='password')
+
+
+class ConcurrentToggleTest(TransactionTestCase):
+    """Один и тот же рецепт добавляют из нескольких потоков сразу."""
+    threads = 8
+
+    def setUp(self):
+        self.user = create_user('user')
+        author = create_user('author')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            image='recipes/test.png', cooking_time=10)
+        self.amounts = {}
+        for index, amount in enumerate((1, 2, 3)):
+            ingredient = Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit='г')
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=amount)
+            self.amounts[ingredient.pk] = amount
+
+    def post_concurrently(self, action):
+        url = f'/api/recipes/{self.recipe.pk}/{action}/'
+        return sorted(run_concurrently(
+            [lambda: post_as(self.user, url)] * self.threads))
+
+    def test_favorite(self):
+        codes = self.post_concurrently('favorite')
+        self.assertEqual(codes, [201] + [400] * (self.threads - 1))
+        self.assertEqual(Favourite.objects.filter(
+            user=self.user, recipe=self.recipe).count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_shopping_cart(self):
+        codes = self.post_concurrently('shopping_cart')
+        self.assertEqual(codes, [201] + [400] * (self.threads - 1))
+        self.assertEqual(ShoppingCart.objects.filter(
+            user=self.user, recipe=self.recipe).count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 1)
+        self.assertEqual(dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient_id', 'amount')),
+            self.amounts)
+
+
+class ConcurrentShoppingListTest(TransactionTestCase):
+    """Позиции списка покупок, которых ещё нет, создаются из нескольких
+    транзакций сразу."""
+    threads = 6
+
+    def setUp(self):
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.shared = Ingredient.objects.create(
+            name='тестовая мука', measurement_unit='г')
+        self.recipes = []
+        for index in range(self.threads):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'Рецепт {index}', text='Описание',
+                image='recipes/test.png', cooking_time=10)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=self.shared, amount=index + 1)
+            self.recipes.append(recipe)
+
+    def shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredient_id', 'amount'))
+
+    def test_recipes_with_shared_ingredient(self):
+        codes = run_concurrently([
+            lambda recipe=recipe: post_as(
+                self.user, f'/api/recipes/{recipe.pk}/shopping_cart/')
+            for recipe in self.recipes
+        ])
+        self.assertEqual(codes, [201] * self.threads)
+        self.assertEqual(self.shopping_list(), {
+            self.shared.pk: sum(range(1, self.threads + 1))})
+
+    # SQLite не ждёт, а сразу отказывает транзакции, которой после чтения
+    # нужна запись: PATCH сначала читает рецепт.
+    @skipIf(connection.vendor == 'sqlite',
+            'SQLite не повышает блокировку чтения до записи')
+    def test_recipe_update_during_add(self):
+        first, second = self.recipes[:2]
+        ShoppingCart.objects.create(user=self.user, recipe=first)
+        ShoppingListItem.objects.rebuild()
+        other = Ingredient.objects.create(
+            name='тестовый сахар', measurement_unit='г')
+        data = {'ingredients': [{'id': self.shared.pk, 'amount': 4},
+                                {'id': other.pk, 'amount': 5}],
+                'tags': []}
+        codes = run_concurrently([
+            lambda: post_as(self.author, f'/api/recipes/{first.pk}/',
+                            data, method='patch'),
+            lambda: post_as(self.user,
+                            f'/api/recipes/{second.pk}/shopping_cart/'),
+        ])
+        self.assertEqual(sorted(codes), [200, 201])
+        self.assertEqual(self.shopping_list(),
+                         {self.shared.pk: 4 + 2, other.pk: 5})
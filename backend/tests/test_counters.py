@@ -0,0 +1,106 @@
+import pytest
+from recipes.models import Recipe, reconcile_counters
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipes(make_recipe):
+    return [make_recipe(name=f'Рецепт {index}') for index in range(3)]
+
+
+@pytest.fixture
+def users(django_user_model):
+    return [
+        django_user_model.objects.create_user(
+            email=f'reader{index}@example.com', username=f'reader{index}',
+            first_name='Читатель', last_name='Читателев',
+            password='password')
+        for index in range(3)
+    ]
+
+
+def toggle(client, recipe, action, method='post'):
+    response = getattr(client, method)(f'/api/recipes/{recipe.pk}/{action}/')
+    assert response.status_code in (201, 204), response.content
+
+
+def subscribe(client, author, method='post'):
+    response = getattr(client, method)(f'/api/users/{author.pk}/subscribe/')
+    assert response.status_code in (201, 204), response.content
+
+
+@pytest.fixture
+def activity(client_for, users, author, recipes):
+    """Каждый читатель добавляет рецепты в избранное и корзину и
+    подписывается на автора."""
+    for user in users:
+        client = client_for(user)
+        for recipe in recipes:
+            toggle(client, recipe, 'favorite')
+            toggle(client, recipe, 'shopping_cart')
+        subscribe(client, author)
+
+
+def test_initial_counters(activity, author, recipes):
+    assert reconcile_counters(fix=False) == []
+    author.refresh_from_db()
+    assert (author.recipes_count, author.subscribers_count) == (3, 3)
+    recipes[0].refresh_from_db()
+    assert (recipes[0].favorites_count, recipes[0].in_carts_count) == (3, 3)
+
+
+def test_toggles(activity, client_for, users, recipes):
+    client = client_for(users[0])
+    toggle(client, recipes[0], 'favorite', 'delete')
+    toggle(client, recipes[1], 'shopping_cart', 'delete')
+    toggle(client, recipes[1], 'shopping_cart')
+    toggle(client, recipes[2], 'favorite', 'delete')
+    toggle(client, recipes[2], 'shopping_cart', 'delete')
+    assert reconcile_counters(fix=False) == []
+    recipes[2].refresh_from_db()
+    assert (recipes[2].favorites_count, recipes[2].in_carts_count) == (2, 2)
+
+
+def test_user_delete(activity, users):
+    users[0].delete()
+    assert reconcile_counters(fix=False) == []
+
+
+def test_author_delete(activity, author):
+    author.delete()
+    assert reconcile_counters(fix=False) == []
+
+
+def test_recipe_delete(activity, author_client, recipes):
+    response = author_client.delete(f'/api/recipes/{recipes[0].pk}/')
+    assert response.status_code == 204
+    assert reconcile_counters(fix=False) == []
+
+
+def test_subscribe_unsubscribe(activity, client_for, users, author):
+    for user in users[:2]:
+        subscribe(client_for(user), author, 'delete')
+    subscribe(client_for(users[0]), author)
+    assert reconcile_counters(fix=False) == []
+    author.refresh_from_db()
+    assert author.subscribers_count == 2
+
+
+def test_reconcile_fixes_drift(activity, recipes):
+    Recipe.objects.filter(pk=recipes[0].pk).update(favorites_count=10)
+    [(obj, field, stored, actual)] = reconcile_counters()
+    assert (obj.pk, field, stored, actual) == (
+        recipes[0].pk, 'favorites_count', 10, 3)
+    assert reconcile_counters(fix=False) == []
+
+
+def test_popular_ordering(anon_client, client_for, users, recipes):
+    for user, count in zip(users, (1, 3, 2)):
+        for recipe in recipes[:count]:
+            toggle(client_for(user), recipe, 'favorite')
+    for url in ('/api/recipes/?ordering=popular',
+                '/api/recipes/?ordering=popular&cursor='):
+        results = anon_client.get(url).json()['results']
+        assert [item['id'] for item in results] == [
+            recipe.pk for recipe in recipes]
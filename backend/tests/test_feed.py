@@ -0,0 +1,69 @@
+import pytest
+from recipes.models import FeedEntry
+from users.models import Subscribe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def followers(settings, django_user_model, author):
+    settings.FEED_FANOUT_LIMIT = 2
+    followers = [
+        django_user_model.objects.create_user(
+            email=f'follower{index}@example.com',
+            username=f'follower{index}', first_name='Подписчик',
+            last_name='Подписчиков', password='password')
+        for index in range(3)
+    ]
+    for follower in followers:
+        Subscribe.objects.create(user=follower, author=author)
+    return followers
+
+
+def feed_recipes(user):
+    return set(FeedEntry.objects.filter(user=user).values_list(
+        'recipe_id', flat=True))
+
+
+def test_popular_author_is_not_fanned_out(
+        followers, make_recipe, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe = make_recipe()
+    assert not FeedEntry.objects.filter(recipe=recipe).exists()
+
+
+def test_backfill_when_author_drops_below_limit(
+        followers, make_recipe, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe = make_recipe()
+    with django_capture_on_commit_callbacks(execute=True):
+        Subscribe.objects.filter(user=followers[2]).delete()
+    assert feed_recipes(followers[0]) == {recipe.pk}
+    assert feed_recipes(followers[1]) == {recipe.pk}
+    assert feed_recipes(followers[2]) == set()
+
+
+def test_feed_endpoint_after_backfill(
+        client_for, followers, make_recipe,
+        django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        old = make_recipe(name='Старый')
+    with django_capture_on_commit_callbacks(execute=True):
+        Subscribe.objects.filter(user=followers[2]).delete()
+    with django_capture_on_commit_callbacks(execute=True):
+        new = make_recipe(name='Новый')
+    response = client_for(followers[0]).get('/api/recipes/feed/')
+    assert [item['id'] for item in response.json()['results']] == [
+        new.pk, old.pk]
+
+
+def test_no_backfill_while_above_limit(
+        settings, followers, make_recipe,
+        django_capture_on_commit_callbacks):
+    settings.FEED_FANOUT_LIMIT = 1
+    with django_capture_on_commit_callbacks(execute=True):
+        make_recipe()
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        Subscribe.objects.filter(user=followers[2]).delete()
+    assert callbacks == []
+    assert not FeedEntry.objects.exists()
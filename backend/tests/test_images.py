@@ -0,0 +1,77 @@
+import io
+import os
+import time
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from PIL import Image
+from recipes import images
+from recipes.models import Recipe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def sync_thumbnails(settings):
+    settings.IMAGE_PROCESSING_ASYNC = False
+
+
+def png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='image.png')
+
+
+def make_recipe_with_image(author, content):
+    recipe = Recipe(author=author, name='Рецепт', text='Описание',
+                    cooking_time=10)
+    recipe.image.save('image.png', content, save=False)
+    recipe.save()
+    recipe.refresh_from_db()
+    return recipe
+
+
+def test_shared_thumbnail_survives_lost_race(author, monkeypatch):
+    first = make_recipe_with_image(author, png('red'))
+    second = make_recipe_with_image(author, png('red'))
+    assert first.image.name == second.image.name
+    assert first.thumbnail.name == second.thumbnail.name
+    storage = second.thumbnail.storage
+    assert storage.exists(second.thumbnail.name)
+
+    render_thumbnail = images.render_thumbnail
+
+    def change_image_while_rendering(file):
+        result = render_thumbnail(file)
+        Recipe.objects.filter(pk=first.pk).update(image='recipes/other.png')
+        return result
+
+    monkeypatch.setattr(images, 'render_thumbnail',
+                        change_image_while_rendering)
+    images.make_thumbnail(first.pk)
+
+    second.refresh_from_db()
+    assert storage.exists(second.thumbnail.name)
+
+
+def test_reused_upload_is_protected_from_collect_media(author):
+    recipe = make_recipe_with_image(author, png('blue'))
+    storage = recipe.image.storage
+    names = (recipe.image.name, recipe.thumbnail.name)
+    Recipe.objects.filter(pk=recipe.pk).delete()
+    day_ago = time.time() - 24 * 60 * 60
+    for name in names:
+        os.utime(storage.path(name), (day_ago, day_ago))
+
+    assert storage.save('recipes/image.png', png('blue')) == names[0]
+    call_command('collect_media', '--min-age', '3600', stdout=io.StringIO())
+    assert storage.exists(names[0])
+    assert not storage.exists(names[1])
+
+
+def test_collect_media_keeps_referenced_files(author):
+    recipe = make_recipe_with_image(author, png('green'))
+    call_command('collect_media', '--min-age', '0', stdout=io.StringIO())
+    assert recipe.image.storage.exists(recipe.image.name)
+    assert recipe.thumbnail.storage.exists(recipe.thumbnail.name)
@@ -0,0 +1,77 @@
+import pytest
+from api import memory_index
+from api.ingredient_index import ingredient_index
+from api.memory_index import TTLIndex
+from api.pantry_index import pantry_index
+
+
+class CountingIndex(TTLIndex):
+    ttl_setting = 'COUNTING_INDEX_TTL'
+
+    def __init__(self):
+        super().__init__()
+        self.builds = 0
+
+    def _build(self):
+        self.builds += 1
+        return self.builds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memory_index.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    ingredient_index.invalidate()
+    pantry_index.invalidate()
+    yield
+    ingredient_index.invalidate()
+    pantry_index.invalidate()
+
+
+def test_ttl_index_builds_once_until_expired(settings, clock):
+    settings.COUNTING_INDEX_TTL = 60
+    index = CountingIndex()
+    assert index._loaded_state() is None
+    assert index._get_state() == 1
+    clock[0] += 60
+    assert index._get_state() == 1
+    clock[0] += 1
+    assert index._get_state() == 2
+    assert index._loaded_state() == 2
+
+
+def test_ttl_index_invalidate(settings, clock):
+    settings.COUNTING_INDEX_TTL = 60
+    index = CountingIndex()
+    index._get_state()
+    index.invalidate()
+    assert index._loaded_state() is None
+    assert index._get_state() == 2
+
+
+@pytest.mark.django_db
+def test_ingredient_index_search(ingredients):
+    assert len(ingredient_index.search('ИНГРЕД')) == len(ingredients)
+    assert ingredient_index.search('ингредиент 3', limit=1) == [
+        ingredient_index.search('ингредиент 3')[0]]
+
+
+@pytest.mark.django_db
+def test_pantry_index_rank_and_updates(make_recipe, ingredients):
+    full = make_recipe(amounts=(1, 1))
+    partial = make_recipe(amounts=(1, 1, 1, 1))
+    pantry = [ingredients[0].pk, ingredients[1].pk]
+    assert pantry_index.rank(pantry) == [
+        (full.pk, 1.0, 2), (partial.pk, 0.5, 2)]
+    assert pantry_index.rank(pantry, min_coverage=0.75) == [
+        (full.pk, 1.0, 2)]
+
+    pantry_index.remove_recipes([full.pk])
+    assert pantry_index.rank(pantry) == [(partial.pk, 0.5, 2)]
+    pantry_index.update_recipes([full.pk])
+    assert pantry_index.rank(pantry)[0] == (full.pk, 1.0, 2)
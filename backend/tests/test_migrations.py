@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+
+class MigrationTest(TransactionTestCase):
+    """Откатывает recipes до migrate_from, даёт заполнить базу
+    историческими моделями и применяет migrate_to."""
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate([('recipes', self.migrate_from)])
+        self.old_apps = self.applied_state().apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def applied_state(self):
+        """Состояние моделей по применённым миграциям всех приложений:
+        откат recipes откатывает и зависящие от него миграции users."""
+        loader = MigrationExecutor(connection).loader
+        return loader.project_state(list(loader.applied_migrations))
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('recipes', self.migrate_to)])
+        return self.applied_state().apps
+
+
+class UniqueIngredientMigrationTest(MigrationTest):
+    migrate_from = '0005_filter_indexes'
+    migrate_to = '0006_unique_ingredient'
+
+    def test_duplicates_merged(self):
+        model = self.old_apps.get_model
+        user = model('users', 'User').objects.create(
+            email='user@example.com', username='user', first_name='user',
+            last_name='user')
+        kept, first, second = (
+            model('recipes', 'Ingredient').objects.create(
+                name='тестовая мука', measurement_unit='г')
+            for _ in range(3)
+        )
+        recipe = model('recipes', 'Recipe').objects.create(
+            author=user, name='Рецепт', text='Описание',
+            image='recipes/test.png', cooking_time=10)
+        model('recipes', 'RecipeIngredient').objects.create(
+            recipe=recipe, ingredient=first, amount=2)
+        items = model('recipes', 'ShoppingListItem').objects
+        items.create(user=user, ingredient=kept, amount=1)
+        items.create(user=user, ingredient=first, amount=2)
+        items.create(user=user, ingredient=second, amount=3)
+
+        model = self.migrate().get_model
+        self.assertEqual(list(model('recipes', 'Ingredient').objects.filter(
+            name='тестовая мука').values_list('id', flat=True)), [kept.pk])
+        self.assertEqual(model('recipes', 'RecipeIngredient').objects.get(
+            recipe_id=recipe.pk).ingredient_id, kept.pk)
+        self.assertEqual(list(
+            model('recipes', 'ShoppingListItem').objects.filter(
+                user_id=user.pk).values_list('ingredient_id', 'amount')),
+            [(kept.pk, 6)])
+
+
+def create_favourites(model, count):
+    user = model('users', 'User').objects.create(
+        email='user@example.com', username='user', first_name='user',
+        last_name='user')
+    recipes = model('recipes', 'Recipe').objects
+    return [
+        model('recipes', 'Favourite').objects.create(
+            user=user, recipe=recipes.create(
+                author=user, name=f'Рецепт {index}', text='Описание',
+                image='recipes/test.png', cooking_time=10))
+        for index in range(count)
+    ]
+
+
+class TrendingMigrationTest(MigrationTest):
+    migrate_from = '0011_popularity_counters'
+    migrate_to = '0012_trending'
+
+    def test_old_events_outside_window(self):
+        create_favourites(self.old_apps.get_model, 2)
+        favourites = self.migrate().get_model('recipes', 'Favourite')
+        self.assertEqual(
+            {event.created_at.year for event in favourites.objects.all()},
+            {1970})
+
+
+class TrendingBackfillMigrationTest(MigrationTest):
+    migrate_from = '0013_search_without_foreign_key'
+    migrate_to = '0014_trending_backfill'
+
+    def test_events_with_migration_time_aged(self):
+        model = self.old_apps.get_model
+        backfilled, also_backfilled, recent = create_favourites(model, 3)
+        favourites = model('recipes', 'Favourite').objects
+        migrated_at = timezone.now() - timedelta(hours=1)
+        favourites.filter(pk__in=[backfilled.pk, also_backfilled.pk]).update(
+            created_at=migrated_at)
+
+        favourites = self.migrate().get_model('recipes', 'Favourite').objects
+        self.assertEqual(
+            {pk: created_at.year for pk, created_at in
+             favourites.values_list('pk', 'created_at')},
+            {backfilled.pk: 1970, also_backfilled.pk: 1970,
+             recent.pk: timezone.now().year})
+
+    def test_single_event_kept(self):
+        [event] = create_favourites(self.old_apps.get_model, 1)
+        favourites = self.migrate().get_model('recipes', 'Favourite').objects
+        self.assertEqual(favourites.get().created_at, event.created_at)
@@ -0,0 +1,100 @@
+import base64
+import json
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from recipes.models import Recipe
+from users.models import Subscribe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipes(make_recipe):
+    """Рецепты с повторяющимися created_at и favorites_count, чтобы
+    порядок решали вторичные поля курсора."""
+    now = timezone.now()
+    recipes = [make_recipe(name=f'Рецепт {index}') for index in range(11)]
+    for index, recipe in enumerate(recipes):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            created_at=now - timedelta(minutes=index // 3),
+            favorites_count=index % 4)
+    return recipes
+
+
+def walk(client, url):
+    """Идёт по ссылкам next до конца и возвращает id всех строк."""
+    ids = []
+    pages = 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        data = response.json()
+        ids.extend(item['id'] for item in data['results'])
+        url = data['next']
+        pages += 1
+    return ids, pages
+
+
+@pytest.mark.parametrize('ordering, params', [
+    (('-created_at', '-id'), ''),
+    (('-favorites_count', '-created_at', '-id'), '&ordering=popular'),
+])
+def test_recipe_cursor_walk(anon_client, recipes, ordering, params):
+    ids, pages = walk(anon_client, f'/api/recipes/?cursor=&limit=3{params}')
+    expected = list(Recipe.objects.order_by(*ordering)
+                    .values_list('id', flat=True))
+    assert ids == expected
+    assert pages == 4
+
+
+@pytest.mark.parametrize('ordering, params', [
+    (('-created_at', '-id'), ''),
+    (('-favorites_count', '-created_at', '-id'), '&ordering=popular'),
+])
+def test_recipe_page_walk(anon_client, recipes, ordering, params):
+    ids, pages = walk(anon_client, f'/api/recipes/?limit=3{params}')
+    expected = list(Recipe.objects.order_by(*ordering)
+                    .values_list('id', flat=True))
+    assert ids == expected
+    assert pages == 4
+
+
+def test_cursor_count(anon_client, recipes):
+    url = '/api/recipes/?cursor=&limit=3'
+    assert 'count' not in anon_client.get(url).json()
+    for mode in ('exact', 'approx'):
+        data = anon_client.get(f'{url}&count={mode}').json()
+        assert data['count'] == len(recipes)
+        assert len(data['results']) == 3
+
+
+def test_subscriptions_cursor_walk(user, user_client, django_user_model):
+    authors = [
+        django_user_model.objects.create_user(
+            email=f'author{index}@example.com', username=f'author{index}',
+            first_name='Автор', last_name='Авторов', password='password')
+        for index in range(5)
+    ]
+    Subscribe.objects.bulk_create(
+        Subscribe(user=user, author=author) for author in authors)
+    ids, pages = walk(user_client,
+                      '/api/users/subscriptions/?cursor=&limit=2')
+    assert ids == sorted(author.pk for author in authors)
+    assert pages == 3
+
+
+def encode(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.mark.parametrize('cursor', [
+    'не-курсор',
+    encode({'created_at': '2023-01-01'}),
+    encode(['2023-01-01T00:00:00']),
+    encode(['не дата', 1]),
+])
+def test_malformed_cursor(anon_client, recipes, cursor):
+    response = anon_client.get(f'/api/recipes/?cursor={cursor}')
+    assert response.status_code == 404
@@ -0,0 +1,35 @@
+import pytest
+from django.core.management import CommandError, call_command
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def admin_client(client_for, django_user_model):
+    admin = django_user_model.objects.create_superuser(
+        email='admin@example.com', username='admin', first_name='admin',
+        last_name='admin', password='password')
+    return client_for(admin)
+
+
+def test_metrics_show_recipe_cache_stats(admin_client, anon_client,
+                                         make_recipe):
+    for index in range(3):
+        make_recipe(name=f'Рецепт {index}')
+    anon_client.get('/api/recipes/')
+    anon_client.get('/api/recipes/')
+    stats = admin_client.get('/api/metrics/').json()['recipe_cache']
+    assert stats == {'hits': 3, 'misses': 3, 'hit_ratio': 0.5}
+
+    assert admin_client.delete('/api/metrics/').status_code == 204
+    stats = admin_client.get('/api/metrics/').json()['recipe_cache']
+    assert stats == {'hits': 0, 'misses': 0, 'hit_ratio': 0}
+
+
+def test_metrics_require_admin(user_client):
+    assert user_client.get('/api/metrics/').status_code == 403
+
+
+def test_command_refuses_process_local_cache():
+    with pytest.raises(CommandError, match='/api/metrics/'):
+        call_command('recipe_cache_stats')
@@ -0,0 +1,64 @@
+import pytest
+from recipes.models import Recipe
+
+pytestmark = pytest.mark.django_db
+
+# Ингредиенты и тэги проверяются одним запросом in_bulk каждый,
+# сколько бы id ни пришло.
+VALIDATION_QUERIES = 2
+
+
+def payload(ingredient_ids, tag_ids):
+    return {
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 5,
+        'ingredients': [{'id': pk, 'amount': 1} for pk in ingredient_ids],
+        'tags': tag_ids,
+    }
+
+
+def create(client, data):
+    return client.post('/api/recipes/', data, format='json')
+
+
+def test_missing_and_duplicate_ids(django_assert_num_queries, author_client,
+                                   ingredients, tags):
+    first, second = ingredients[0].pk, ingredients[1].pk
+    data = payload([first, 999999, second, first, 999998, first],
+                   [tags[0].pk, tags[0].pk, 999999])
+    with django_assert_num_queries(VALIDATION_QUERIES):
+        response = create(author_client, data)
+    assert response.status_code == 400
+    assert response.json() == {
+        'ingredients': [
+            'Ингредиенты не найдены: 999999, 999998.',
+            f'Ингредиенты повторяются: {first}.',
+        ],
+        'tags': [
+            'Теги не найдены: 999999.',
+            f'Теги повторяются: {tags[0].pk}.',
+        ],
+    }
+    assert not Recipe.objects.exists()
+
+
+@pytest.mark.parametrize('count', [1, 5])
+def test_validation_queries_do_not_grow(django_assert_num_queries,
+                                        author_client, ingredients, tags,
+                                        count):
+    data = payload([ingredient.pk for ingredient in ingredients[:count]],
+                   [tag.pk for tag in tags] + [999999])
+    with django_assert_num_queries(VALIDATION_QUERIES):
+        response = create(author_client, data)
+    assert response.json() == {'tags': ['Теги не найдены: 999999.']}
+
+
+def test_creates_recipe(author_client, ingredients, tags):
+    data = payload([ingredient.pk for ingredient in ingredients[:3]],
+                   [tags[0].pk])
+    response = create(author_client, data)
+    assert response.status_code == 201, response.content
+    recipe = Recipe.objects.get()
+    assert list(recipe.ingredients.order_by('pk')) == ingredients[:3]
+    assert list(recipe.tags.all()) == [tags[0]]
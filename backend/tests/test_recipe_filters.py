@@ -0,0 +1,81 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tagged(make_recipe, tags):
+    first, second, third = tags
+    return {
+        'both': make_recipe(tags=[first, second], name='Оба тэга'),
+        'first': make_recipe(tags=[first], name='Первый тэг'),
+        'second': make_recipe(tags=[second], name='Второй тэг'),
+        'third': make_recipe(tags=[third], name='Третий тэг'),
+    }
+
+
+def recipe_ids(client, query):
+    response = client.get(f'/api/recipes/?limit=50&{query}')
+    assert response.status_code == 200, response.content
+    ids = [item['id'] for item in response.json()['results']]
+    assert len(ids) == len(set(ids)), 'рецепты повторяются'
+    assert response.json()['count'] == len(ids)
+    return set(ids)
+
+
+def test_tags_any_without_duplicates(anon_client, tagged):
+    ids = recipe_ids(anon_client, 'tags=test-tag-0&tags=test-tag-1')
+    assert ids == {tagged[key].id for key in ('both', 'first', 'second')}
+
+
+def test_tags_any_is_default(anon_client, tagged):
+    assert (recipe_ids(anon_client, 'tags=test-tag-0&tags=test-tag-1')
+            == recipe_ids(anon_client,
+                          'tags=test-tag-0&tags=test-tag-1&tags_match=any'))
+
+
+def test_tags_all(anon_client, tagged):
+    ids = recipe_ids(
+        anon_client, 'tags=test-tag-0&tags=test-tag-1&tags_match=all')
+    assert ids == {tagged['both'].id}
+
+
+def test_tags_all_single_tag(anon_client, tagged):
+    ids = recipe_ids(anon_client, 'tags=test-tag-1&tags_match=all')
+    assert ids == {tagged['both'].id, tagged['second'].id}
+
+
+@pytest.mark.parametrize('tags_match', ['any', 'all'])
+@pytest.mark.parametrize('query', ['tags=missing',
+                                   'tags=test-tag-0&tags=missing'])
+def test_unknown_tag_is_rejected(anon_client, tagged, query, tags_match):
+    response = anon_client.get(
+        f'/api/recipes/?{query}&tags_match={tags_match}')
+    assert response.status_code == 400
+    assert 'tags' in response.json()
+
+
+def test_unknown_tags_match_is_rejected(anon_client, tagged):
+    response = anon_client.get('/api/recipes/?tags=test-tag-0&tags_match=x')
+    assert response.status_code == 400
+
+
+def test_tags_filter_has_fixed_plan(anon_client, tagged):
+    """Число запросов и их вид не зависят от числа тэгов, а тэги
+    проверяются подзапросом EXISTS без JOIN."""
+    captured = []
+    for query in ('tags=test-tag-0',
+                  'tags=test-tag-0&tags=test-tag-1&tags=test-tag-2'):
+        anon_client.get(f'/api/recipes/?{query}')
+        with CaptureQueriesContext(connection) as context:
+            anon_client.get(f'/api/recipes/?{query}')
+        captured.append([item['sql'] for item in context.captured_queries])
+    assert len(captured[0]) == len(captured[1])
+    recipe_queries = [sql for sql in captured[0] + captured[1]
+                      if sql.startswith('SELECT "recipes_recipe"."id"')]
+    assert recipe_queries
+    for sql in recipe_queries:
+        assert 'EXISTS' in sql
+        assert 'JOIN "recipes_recipe_tags"' not in sql
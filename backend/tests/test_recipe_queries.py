@@ -0,0 +1,56 @@
+import pytest
+from recipes.models import Favourite, ShoppingCart
+
+pytestmark = pytest.mark.django_db
+
+# COUNT, рецепты, авторы, тэги и ингредиенты; тэги и ингредиенты
+# берутся из кэша, если он уже прогрет.
+LIST_QUERIES = 5
+LIST_QUERIES_CACHED = 3
+# Рецепт, автор, тэги и ингредиенты.
+DETAIL_QUERIES = 4
+DETAIL_QUERIES_CACHED = 2
+
+
+@pytest.fixture
+def recipes(make_recipe, user):
+    recipes = [make_recipe(name=f'Рецепт {index}') for index in range(50)]
+    Favourite.objects.create(user=user, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[-1])
+    return recipes
+
+
+@pytest.mark.parametrize('client_name', ['anon_client', 'user_client'])
+@pytest.mark.parametrize('page_size', [1, 50])
+def test_recipe_list_queries(request, django_assert_num_queries, recipes,
+                             client_name, page_size):
+    client = request.getfixturevalue(client_name)
+    url = f'/api/recipes/?limit={page_size}'
+    with django_assert_num_queries(LIST_QUERIES):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.json()['results']) == page_size
+    with django_assert_num_queries(LIST_QUERIES_CACHED):
+        assert client.get(url).status_code == 200
+
+
+def test_recipe_list_user_flags(user_client, recipes):
+    results = user_client.get('/api/recipes/?limit=50').json()['results']
+    flags = {item['id']: (item['is_favorited'], item['is_in_shopping_cart'])
+             for item in results}
+    assert flags.pop(recipes[0].id) == (True, False)
+    assert flags.pop(recipes[-1].id) == (False, True)
+    assert set(flags.values()) == {(False, False)}
+
+
+@pytest.mark.parametrize('client_name', ['anon_client', 'user_client'])
+def test_recipe_detail_queries(request, django_assert_num_queries, recipes,
+                               client_name):
+    client = request.getfixturevalue(client_name)
+    url = f'/api/recipes/{recipes[0].id}/'
+    with django_assert_num_queries(DETAIL_QUERIES):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.json()['ingredients']) == 3
+    with django_assert_num_queries(DETAIL_QUERIES_CACHED):
+        assert client.get(url).status_code == 200
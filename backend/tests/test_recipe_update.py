@@ -0,0 +1,86 @@
+import re
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import RecipeIngredient
+
+pytestmark = pytest.mark.django_db
+
+WRITE_RE = re.compile(
+    r'^(INSERT|UPDATE|DELETE)(?: OR IGNORE)?(?: INTO| FROM)? '
+    r'"(recipes_recipeingredient|recipes_recipe_tags)"')
+
+
+@pytest.fixture
+def recipe(make_recipe):
+    return make_recipe(amounts=(1, 2, 3))
+
+
+def payload(ingredients, tags):
+    return {
+        'ingredients': [{'id': ingredient.id, 'amount': amount}
+                        for ingredient, amount in ingredients],
+        'tags': [tag.id for tag in tags],
+    }
+
+
+def patch_writes(client, recipe, data):
+    """Запросы INSERT/UPDATE/DELETE к ингредиентам и тэгам рецепта."""
+    with CaptureQueriesContext(connection) as context:
+        response = client.patch(f'/api/recipes/{recipe.id}/', data,
+                                format='json')
+    assert response.status_code == 200, response.content
+    writes = []
+    for query in context.captured_queries:
+        match = WRITE_RE.match(query['sql'])
+        if match:
+            writes.append(match.groups())
+    return writes
+
+
+def amounts(recipe):
+    return dict(RecipeIngredient.objects.filter(
+        recipe=recipe).values_list('ingredient_id', 'amount'))
+
+
+def test_unchanged_payload_writes_nothing(author_client, recipe,
+                                          ingredients, tags):
+    rows = list(RecipeIngredient.objects.filter(
+        recipe=recipe).values_list('pk', flat=True))
+    data = payload(zip(ingredients, (1, 2, 3)), tags[:2])
+    assert patch_writes(author_client, recipe, data) == []
+    assert list(RecipeIngredient.objects.filter(
+        recipe=recipe).values_list('pk', flat=True)) == rows
+
+
+def test_changed_amount_is_one_update(author_client, recipe, ingredients,
+                                      tags):
+    data = payload(zip(ingredients, (1, 5, 3)), tags[:2])
+    assert patch_writes(author_client, recipe, data) == [
+        ('UPDATE', 'recipes_recipeingredient')]
+    assert amounts(recipe) == {ingredients[0].id: 1, ingredients[1].id: 5,
+                               ingredients[2].id: 3}
+
+
+def test_added_and_removed_ingredient(author_client, recipe, ingredients,
+                                      tags):
+    data = payload(zip([ingredients[0], ingredients[1], ingredients[3]],
+                       (1, 2, 4)), tags[:2])
+    assert sorted(patch_writes(author_client, recipe, data)) == [
+        ('DELETE', 'recipes_recipeingredient'),
+        ('INSERT', 'recipes_recipeingredient'),
+    ]
+    assert amounts(recipe) == {ingredients[0].id: 1, ingredients[1].id: 2,
+                               ingredients[3].id: 4}
+
+
+def test_changed_tags_touch_only_difference(author_client, recipe,
+                                            ingredients, tags):
+    data = payload(zip(ingredients, (1, 2, 3)), tags[1:])
+    assert sorted(patch_writes(author_client, recipe, data)) == [
+        ('DELETE', 'recipes_recipe_tags'),
+        ('INSERT', 'recipes_recipe_tags'),
+    ]
+    assert set(recipe.tags.values_list('pk', flat=True)) == {
+        tag.pk for tag in tags[1:]}
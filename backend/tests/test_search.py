@@ -0,0 +1,83 @@
+import pytest
+from django.db import connection
+from recipes.models import Ingredient, RecipeIngredient
+from recipes.search import SEARCH_TABLE, stem
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def make_indexed(django_capture_on_commit_callbacks, make_recipe):
+    """Рецепт, попавший в поисковый индекс: индекс обновляется после
+    коммита, которого внутри теста нет."""
+    def make_indexed(name, text='Описание', **kwargs):
+        with django_capture_on_commit_callbacks(execute=True):
+            recipe = make_recipe(name=name, **kwargs)
+            if text != recipe.text:
+                recipe.text = text
+                recipe.save()
+        return recipe
+    return make_indexed
+
+
+def search(client, query):
+    response = client.get('/api/recipes/', {'search': query})
+    assert response.status_code == 200
+    return [item['id'] for item in response.json()['results']]
+
+
+def indexed_ids():
+    column = 'rowid' if connection.vendor == 'sqlite' else 'recipe_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {column} FROM {SEARCH_TABLE}')
+        return {row[0] for row in cursor.fetchall()}
+
+
+@pytest.mark.parametrize('words', [
+    ('пирог', 'пироги', 'пирогов', 'пирогами'),
+    ('яблочный', 'яблочного', 'яблочная'),
+    ('курица', 'курицей', 'курицу'),
+    ('Ёлка', 'елки'),
+])
+def test_stem_inflected_forms(words):
+    assert len({stem(word) for word in words}) == 1
+
+
+def test_search_matches_other_word_form(anon_client, make_indexed):
+    pie = make_indexed('Яблочный пирог')
+    make_indexed('Куриный суп')
+    assert search(anon_client, 'пирогами') == [pie.pk]
+    assert search(anon_client, 'яблочного пирога') == [pie.pk]
+    assert search(anon_client, 'пирог с грушей') == []
+
+
+def test_name_ranks_above_text(anon_client, make_indexed):
+    in_name = make_indexed('Пирог с вишней')
+    in_text = make_indexed('Десерт', text='Подаётся к пирогу.')
+    assert search(anon_client, 'пирог') == [in_name.pk, in_text.pk]
+
+
+def test_reindex_after_ingredient_rename(anon_client, make_indexed,
+                                         django_capture_on_commit_callbacks):
+    ingredient = Ingredient.objects.create(
+        name='тестовая приправа', measurement_unit='г')
+    recipe = make_indexed('Рагу')
+    RecipeIngredient.objects.create(
+        recipe=recipe, ingredient=ingredient, amount=1)
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.save()
+    assert search(anon_client, 'приправой') == [recipe.pk]
+
+    ingredient.name = 'тестовый шафран'
+    with django_capture_on_commit_callbacks(execute=True):
+        ingredient.save()
+    assert search(anon_client, 'шафрана') == [recipe.pk]
+    assert search(anon_client, 'приправой') == []
+
+
+def test_delete_removes_from_index(anon_client, make_indexed):
+    recipe = make_indexed('Блины')
+    assert recipe.pk in indexed_ids()
+    recipe.delete()
+    assert recipe.pk not in indexed_ids()
+    assert search(anon_client, 'блинов') == []
@@ -0,0 +1,99 @@
+import pytest
+from django.core.management import call_command
+from recipes.models import Recipe, ShoppingCart, ShoppingListItem
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def carts(user, author, make_recipe):
+    kept = make_recipe(amounts=(5, 5, 5))
+    deleted = make_recipe(amounts=(5, 1, 1))
+    for owner in (user, author):
+        for recipe in (kept, deleted):
+            ShoppingCart.objects.create(user=owner, recipe=recipe)
+    ShoppingListItem.objects.rebuild()
+    return kept, deleted
+
+
+def shopping_list(user):
+    return sorted(ShoppingListItem.objects.filter(
+        user=user).values_list('ingredient__name', 'amount'))
+
+
+def assert_in_sync(capsys):
+    call_command('rebuild_shopping_lists', '--check')
+    assert 'Расхождений: 0' in capsys.readouterr().out
+
+
+def test_api_delete_updates_shopping_lists(user, author_client, carts,
+                                           capsys):
+    _, deleted = carts
+    response = author_client.delete(f'/api/recipes/{deleted.id}/')
+    assert response.status_code == 204
+    assert [amount for _, amount in shopping_list(user)] == [5, 5, 5]
+    assert_in_sync(capsys)
+
+
+def test_orm_delete_updates_shopping_lists(user, carts, capsys):
+    _, deleted = carts
+    Recipe.objects.get(pk=deleted.pk).delete()
+    assert [amount for _, amount in shopping_list(user)] == [5, 5, 5]
+    assert_in_sync(capsys)
+
+
+def test_author_delete_updates_shopping_lists(user, user_client,
+                                              django_user_model, make_recipe,
+                                              capsys):
+    other = django_user_model.objects.create_user(
+        email='other@example.com', username='other', first_name='Анна',
+        last_name='Смирнова', password='password')
+    kept = make_recipe(amounts=(5, 5, 5))
+    removed = make_recipe(author=other, amounts=(5, 1, 1))
+    for recipe in (kept, removed):
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    ShoppingListItem.objects.rebuild()
+    other.delete()
+    assert [amount for _, amount in shopping_list(user)] == [5, 5, 5]
+    assert_in_sync(capsys)
+    response = user_client.get('/api/recipes/download_shopping_cart/')
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert [line.rsplit(' - ', 1)[1] for line in lines
+            if ' - ' in line] == ['5', '5', '5']
+
+
+@pytest.mark.parametrize('accept', [None, 'application/json', 'text/html'])
+def test_download_ignores_accept_header(user_client, carts, accept):
+    headers = {'HTTP_ACCEPT': accept} if accept else {}
+    response = user_client.get('/api/recipes/download_shopping_cart/',
+                               **headers)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/plain; charset=utf-8'
+    assert response['Content-Disposition'].endswith('.txt')
+
+
+@pytest.mark.parametrize('file_format, content_type', [
+    ('txt', 'text/plain; charset=utf-8'),
+    ('csv', 'text/csv; charset=utf-8'),
+    ('pdf', 'application/pdf'),
+])
+def test_download_format_from_query(user_client, carts, file_format,
+                                    content_type):
+    response = user_client.get(
+        f'/api/recipes/download_shopping_cart/?format={file_format}',
+        HTTP_ACCEPT='application/json')
+    assert response.status_code == 200
+    assert response['Content-Type'] == content_type
+    assert response['Content-Disposition'].endswith(f'.{file_format}')
+
+
+def test_download_unknown_format(user_client, carts):
+    response = user_client.get(
+        '/api/recipes/download_shopping_cart/?format=xml')
+    assert response.status_code == 404
+
+
+def test_download_empty_cart(author_client):
+    response = author_client.get('/api/recipes/download_shopping_cart/',
+                                 HTTP_ACCEPT='application/json')
+    assert response.status_code == 400
@@ -0,0 +1,46 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from users.models import Subscribe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def subscriptions(django_user_model, user, make_recipe):
+    authors = []
+    for index in range(100):
+        author = django_user_model.objects.create_user(
+            email=f'author{index}@example.com', username=f'author{index}',
+            first_name='Автор', last_name='Авторов', password='password')
+        for number in range(2):
+            make_recipe(author=author, name=f'Рецепт {number}')
+        Subscribe.objects.create(user=user, author=author)
+        authors.append(author)
+    return authors
+
+
+def get_page(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response.json()['results'], len(context.captured_queries)
+
+
+@pytest.mark.parametrize('recipes_limit', ['', '&recipes_limit=1'])
+def test_subscriptions_queries_do_not_grow_with_page(
+        user_client, subscriptions, recipes_limit):
+    url = '/api/users/subscriptions/?limit={}' + recipes_limit
+    one, one_queries = get_page(user_client, url.format(1))
+    hundred, hundred_queries = get_page(user_client, url.format(100))
+    assert len(one) == 1
+    assert len(hundred) == 100
+    assert one_queries == hundred_queries
+
+
+def test_subscriptions_recipes_limit(user_client, subscriptions):
+    results, _ = get_page(
+        user_client, '/api/users/subscriptions/?limit=100&recipes_limit=1')
+    assert all(item['is_subscribed'] for item in results)
+    assert {len(item['recipes']) for item in results} == {1}
+    assert {item['recipes_count'] for item in results} == {2}
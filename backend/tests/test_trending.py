@@ -0,0 +1,78 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from recipes.models import Favourite, ShoppingCart, TrendingRecipe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def recipes(make_recipe):
+    return [make_recipe(name=f'Рецепт {index}') for index in range(4)]
+
+
+def add_event(model, user, recipe, hours_ago):
+    event = model.objects.create(user=user, recipe=recipe)
+    model.objects.filter(pk=event.pk).update(
+        created_at=timezone.now() - timedelta(hours=hours_ago))
+
+
+def compute(**options):
+    out = StringIO()
+    call_command('compute_trending', stdout=out, **options)
+    return out.getvalue()
+
+
+def scores():
+    return {recipe_id: round(score, 3) for recipe_id, score in
+            TrendingRecipe.objects.values_list('recipe_id', 'score')}
+
+
+@pytest.fixture
+def events(user, author, recipes):
+    fresh, day_old, cart, stale = recipes
+    add_event(Favourite, user, fresh, 0)
+    add_event(Favourite, user, day_old, 24)
+    add_event(Favourite, author, day_old, 48)
+    add_event(ShoppingCart, user, cart, 24)
+    # За пределами окна в 7 дней.
+    add_event(Favourite, user, stale, 8 * 24)
+    return recipes
+
+
+def test_decay_scores(events):
+    fresh, day_old, cart, stale = events
+    assert compute() == 'Событий по 3 рецептам, в топе 3.\n'
+    # Вклад события вдвое меньше каждые 24 часа, корзина весит 2.
+    assert scores() == {fresh.pk: 1.0, day_old.pk: 0.75, cart.pk: 1.0}
+
+
+def test_top_size(events):
+    fresh, day_old, cart, stale = events
+    compute(size=2, half_life=12)
+    # С полураспадом 12 часов корзина сутки назад весит 2 * 0.25.
+    assert scores() == {fresh.pk: 1.0, cart.pk: 0.5}
+
+
+def test_recompute_replaces_table(events):
+    fresh = events[0]
+    compute()
+    Favourite.objects.all().delete()
+    ShoppingCart.objects.all().delete()
+    add_event(Favourite, fresh.author, fresh, 0)
+    compute()
+    assert scores() == {fresh.pk: 1.0}
+
+
+def test_trending_endpoint(anon_client, events):
+    fresh, day_old, cart, stale = events
+    compute()
+    TrendingRecipe.objects.filter(recipe=cart).update(score=5)
+    day_old.delete()
+    response = anon_client.get('/api/recipes/trending/')
+    assert response.status_code == 200
+    assert [item['id'] for item in response.json()['results']] == [
+        cart.pk, fresh.pk]
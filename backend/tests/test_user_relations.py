@@ -0,0 +1,69 @@
+import pytest
+from api.serializers import RecipeReadSerializer
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Favourite, Recipe, ShoppingCart
+from rest_framework.test import APIRequestFactory
+from users.models import Subscribe
+
+pytestmark = pytest.mark.django_db
+
+
+def relation_queries(context):
+    """Запросы к избранному, корзине и подпискам."""
+    tables = ('recipes_favourite', 'recipes_shoppingcart', 'users_subscribe')
+    return [query['sql'] for query in context.captured_queries
+            if any(f'FROM "{table}"' in query['sql'] for table in tables)]
+
+
+@pytest.mark.parametrize('page_size', [1, 50])
+def test_user_list_loads_only_page_subscriptions(
+        django_user_model, django_assert_num_queries, user, user_client,
+        page_size):
+    authors = [
+        django_user_model.objects.create_user(
+            email=f'author{index}@example.com', username=f'author{index}',
+            first_name='Автор', last_name='Авторов', password='password')
+        for index in range(50)
+    ]
+    Subscribe.objects.create(user=user, author=authors[0])
+    # COUNT, пользователи и подписки на них.
+    with django_assert_num_queries(3):
+        response = user_client.get(f'/api/users/?limit={page_size}')
+    results = response.json()['results']
+    assert len(results) == page_size
+    subscribed = {item['id'] for item in results if item['is_subscribed']}
+    assert subscribed == ({authors[0].id} if page_size == 50 else set())
+
+
+def test_user_list_skips_recipe_relations(user, user_client, make_recipe):
+    recipe = make_recipe()
+    Favourite.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    with CaptureQueriesContext(connection) as context:
+        user_client.get('/api/users/')
+    queries = relation_queries(context)
+    assert len(queries) == 1
+    assert 'users_subscribe' in queries[0]
+    assert '"author_id" IN' in queries[0]
+
+
+def test_recipe_flags_loaded_once_per_page(user, author, make_recipe):
+    Subscribe.objects.create(user=user, author=author)
+    recipes = [make_recipe(name=f'Рецепт {index}') for index in range(3)]
+    Favourite.objects.create(user=user, recipe=recipes[1])
+    ShoppingCart.objects.create(user=user, recipe=make_recipe())
+    request = APIRequestFactory().get('/api/recipes/')
+    request.user = user
+    page = list(Recipe.objects.select_related('author').filter(
+        pk__in=[recipe.pk for recipe in recipes]))
+    with CaptureQueriesContext(connection) as context:
+        data = RecipeReadSerializer(
+            page, many=True, context={'request': request}).data
+    queries = relation_queries(context)
+    assert len(queries) == 3
+    assert all(' IN (' in query for query in queries)
+    assert {item['id']: item['is_favorited'] for item in data} == {
+        recipe.id: recipe == recipes[1] for recipe in recipes}
+    assert not any(item['is_in_shopping_cart'] for item in data)
+    assert all(item['author']['is_subscribed'] for item in data)
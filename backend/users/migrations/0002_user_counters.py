@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    for model, author_field, field in (
+            (apps.get_model('recipes', 'Recipe'), 'author', 'recipes_count'),
+            (apps.get_model('users', 'Subscribe'), 'author',
+             'subscribers_count')):
+        rows = model.objects.filter(**{author_field: models.OuterRef('pk')})
+        counts = rows.order_by().values(author_field).annotate(
+            total=models.Count('pk')).values('total')
+        User.objects.filter(models.Exists(rows)).update(
+            **{field: models.Subquery(counts)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('recipes', '0011_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.RunPython(
+            fill_counters,
+            migrations.RunPython.noop
+        ),
+    ]
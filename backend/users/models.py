@@ -16,6 +16,12 @@ class User(AbstractUser):
         max_length=254,
         unique=True,
     )
+    # Счётчики обновляются F()-выражениями при изменении рецептов
+    # и подписок; manage.py reconcile_counters сверяет их с данными.
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False)
 
     class Meta:
         ordering = ['id']
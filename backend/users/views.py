@@ -1,7 +1,9 @@
 from api.pagination import CustomPagination
 from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, OuterRef, Prefetch, Subquery, Value
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from recipes.models import Recipe
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -13,10 +15,36 @@ from .serializers import CustomUserSerializer, SubscribeSerializer
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit')
+    if limit is None or not limit.isdigit():
+        return None
+    return int(limit)
+
+
+def with_recipes_preview(queryset, limit=None):
+    """Авторы с первыми limit рецептами в recipes_preview.
+
+    Последние рецепты каждого автора отбираются одним запросом через
+    коррелированный подзапрос с LIMIT.
+    """
+    recipes = Recipe.objects.all()
+    if limit is not None:
+        recipes = recipes.filter(pk__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author')
+            ).order_by('-created_at').values('pk')[:limit]
+        ))
+    return queryset.prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+    )
+
+
 class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = CustomPagination
+    cursor_ordering = ('id',)
 
     @action(
         detail=True,
@@ -48,7 +76,12 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(subscribing__user=user)
+        queryset = with_recipes_preview(
+            User.objects.filter(subscribing__user=user).annotate(
+                is_subscribed=Value(True, output_field=BooleanField())
+            ),
+            get_recipes_limit(request),
+        )
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(pages,
                                          many=True,